@@ -40,6 +40,31 @@ class Config:
             self.OPENAI_MODEL = config["OPENAI_MODEL"]
             self.SYNC_DAYS = int(config["SYNC_DAYS"])
             self.CLOCKIFY_SIGNATURES = json.loads(config["CLOCKIFY_SIGNATURES"])
+            self.SYNC_OVERLAP_MINUTES = int(config.get("SYNC_OVERLAP_MINUTES", 30))
+            self.SYNC_WORKERS = int(config.get("SYNC_WORKERS", 4))
+            self.CLOCKIFY_TIMEOUT = float(config.get("CLOCKIFY_TIMEOUT", 10))
+            self.CLOCKIFY_MAX_RETRIES = int(config.get("CLOCKIFY_MAX_RETRIES", 3))
+            self.CLOCKIFY_CONCURRENT_PAGES = int(
+                config.get("CLOCKIFY_CONCURRENT_PAGES", 3)
+            )
+            self.SYNC_FULL_RECONCILIATION_MINUTES = int(
+                config.get("SYNC_FULL_RECONCILIATION_MINUTES", 60)
+            )
+            self.RANKINGS_CACHE_TTL = int(config.get("RANKINGS_CACHE_TTL", 300))
+            self.SYNC_WORKER_POLL_SECONDS = float(
+                config.get("SYNC_WORKER_POLL_SECONDS", 2)
+            )
+            self.SYNC_JOB_MAX_ATTEMPTS = int(config.get("SYNC_JOB_MAX_ATTEMPTS", 3))
+            self.WEBHOOK_COALESCE_SECONDS = int(
+                config.get("WEBHOOK_COALESCE_SECONDS", 10)
+            )
+            self.RAWG_TIMEOUT = float(config.get("RAWG_TIMEOUT", 10))
+            self.RAWG_MAX_RETRIES = int(config.get("RAWG_MAX_RETRIES", 3))
+            self.RAWG_CACHE_DAYS = int(config.get("RAWG_CACHE_DAYS", 30))
+            self.RAWG_CACHE_MAX_ENTRIES = int(config.get("RAWG_CACHE_MAX_ENTRIES", 5000))
+            self.GAME_ENRICHMENT_MAX_ATTEMPTS = int(
+                config.get("GAME_ENRICHMENT_MAX_ATTEMPTS", 5)
+            )
 
         except Exception:
             self.TELEGRAM_GROUP_ID = os.environ["TELEGRAM_GROUP_ID"]
@@ -72,5 +97,30 @@ class Config:
             self.OPENAI_MODEL = os.environ["OPENAI_MODEL"]
             self.SYNC_DAYS = int(os.environ["SYNC_DAYS"])
             self.CLOCKIFY_SIGNATURES = json.loads(os.environ["CLOCKIFY_SIGNATURES"])
+            self.SYNC_OVERLAP_MINUTES = int(os.environ.get("SYNC_OVERLAP_MINUTES", 30))
+            self.SYNC_WORKERS = int(os.environ.get("SYNC_WORKERS", 4))
+            self.CLOCKIFY_TIMEOUT = float(os.environ.get("CLOCKIFY_TIMEOUT", 10))
+            self.CLOCKIFY_MAX_RETRIES = int(os.environ.get("CLOCKIFY_MAX_RETRIES", 3))
+            self.CLOCKIFY_CONCURRENT_PAGES = int(
+                os.environ.get("CLOCKIFY_CONCURRENT_PAGES", 3)
+            )
+            self.SYNC_FULL_RECONCILIATION_MINUTES = int(
+                os.environ.get("SYNC_FULL_RECONCILIATION_MINUTES", 60)
+            )
+            self.RANKINGS_CACHE_TTL = int(os.environ.get("RANKINGS_CACHE_TTL", 300))
+            self.SYNC_WORKER_POLL_SECONDS = float(
+                os.environ.get("SYNC_WORKER_POLL_SECONDS", 2)
+            )
+            self.SYNC_JOB_MAX_ATTEMPTS = int(os.environ.get("SYNC_JOB_MAX_ATTEMPTS", 3))
+            self.WEBHOOK_COALESCE_SECONDS = int(
+                os.environ.get("WEBHOOK_COALESCE_SECONDS", 10)
+            )
+            self.RAWG_TIMEOUT = float(os.environ.get("RAWG_TIMEOUT", 10))
+            self.RAWG_MAX_RETRIES = int(os.environ.get("RAWG_MAX_RETRIES", 3))
+            self.RAWG_CACHE_DAYS = int(os.environ.get("RAWG_CACHE_DAYS", 30))
+            self.RAWG_CACHE_MAX_ENTRIES = int(os.environ.get("RAWG_CACHE_MAX_ENTRIES", 5000))
+            self.GAME_ENRICHMENT_MAX_ATTEMPTS = int(
+                os.environ.get("GAME_ENRICHMENT_MAX_ATTEMPTS", 5)
+            )
 
         self.CURRENT_SEASON = datetime.datetime.now().year
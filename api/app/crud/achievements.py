@@ -3,16 +3,23 @@ import json
 from typing import List, Union
 
 from sqlalchemy import asc, create_engine, desc, func, select, text, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
 from ..config import Config
-from ..crud import time_entries, users, games
+from ..crud import time_entries, users
 from ..database import models, schemas
 from ..utils import actions as actions
 from ..utils import my_utils as utils
-from ..utils.achievements import AchievementsElems
+from ..utils.achievements import (
+    ACHIEVEMENT_RULES,
+    AchievementMetric,
+    AchievementRule,
+    AchievementsElems,
+)
 from ..utils.clockify_api import ClockifyApi
+from ..utils.user_metrics import get_user_metrics
 from ..utils.logger import LogManager
 
 log_manager = LogManager()
@@ -28,10 +35,15 @@ config = Config()
 
 class Achievements:
     from ..utils.achievements import AchievementsElems
-    season = datetime.datetime.now().year
 
     def __init__(self, silent: bool = False) -> None:
         self.silent = silent
+        # Achievement key -> id (loaded once)
+        self.achievement_ids = {}
+        # Per user snapshot (while syncing): user_id -> (season, unlocked ids)
+        self.unlocked = {}
+        # Per user unlocks pending to be written: user_id -> [rows]
+        self.pending = {}
 
     def populate_achievements(self, db: Session):
         # logger.debug("Populating achievements")
@@ -65,6 +77,7 @@ class Achievements:
                 db.execute(stmt)
                 db.commit()
             # print(achievement, "->", achievement.value)
+        self.achievement_ids = {}
 
     def get_achievements_list(self, db: Session) -> list[models.Achievement]:
         return db.query(models.Achievement)
@@ -101,9 +114,63 @@ class Achievements:
             logger.error("Error getting image: " + str(e))
             raise
 
+    def load_achievement_ids(self, db: Session):
+        if len(self.achievement_ids) == 0:
+            self.achievement_ids = {
+                ach.key: ach.id
+                for ach in db.query(models.Achievement.key, models.Achievement.id)
+            }
+
+    def get_ach_id(self, db: Session, key: str) -> int:
+        self.load_achievement_ids(db)
+        if key not in self.achievement_ids:
+            return self.get_ach_by_key(db, key)[0]
+        return self.achievement_ids[key]
+
+    def load_user_achievements(self, db: Session, user_id: int, season: int = None):
+        """
+        Load the achievements unlocked by the user on the season, so checks
+        don't hit the DB. New unlocks are kept until save_user_achievements
+        """
+        if season is None:
+            season = datetime.datetime.now().year
+        self.load_achievement_ids(db)
+        unlocked = (
+            db.query(models.UserAchievement.achievement_id)
+            .filter(
+                models.UserAchievement.user_id == user_id,
+                models.UserAchievement.season == season,
+            )
+            .all()
+        )
+        self.unlocked[user_id] = (season, set(elem[0] for elem in unlocked))
+        self.pending[user_id] = []
+
+    def save_user_achievements(self, db: Session, user_id: int):
+        """Write the pending unlocks of the user and drop the snapshot"""
+        self.unlocked.pop(user_id, None)
+        pending = self.pending.pop(user_id, [])
+        if len(pending) == 0:
+            return
+        try:
+            # Ignore unlocks already written by another sync
+            db.execute(
+                mysql_insert(models.UserAchievement).prefix_with("IGNORE"), pending
+            )
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error("Error saving user achievements: " + str(e))
+            raise e
+
     def check_already_achieved(
-        self, db: Session, user_id: int, key: str, season: int = season
+        self, db: Session, user_id: int, key: str, season: int = None
     ) -> bool:
+        if season is None:
+            season = datetime.datetime.now().year
+        snapshot = self.unlocked.get(user_id)
+        if snapshot is not None and snapshot[0] == season:
+            return self.get_ach_id(db, str(key)) in snapshot[1]
         ach_id = self.get_ach_by_key(db, str(key))
         already_achieved = (
             db.query(models.UserAchievement)
@@ -125,16 +192,31 @@ class Achievements:
         key: str,
         game_id: str = None,
         date: str = None,
-        season: int = season,
+        season: int = None,
     ):
+        if season is None:
+            season = datetime.datetime.now().year
         if date is None:
             date = datetime.datetime.now()
         else:
             date = utils.convert_date_from_text(date)
-        ach_id = self.get_ach_by_key(db, key)
+        ach_id = self.get_ach_id(db, key)
+        snapshot = self.unlocked.get(user_id)
+        if snapshot is not None and snapshot[0] == season:
+            snapshot[1].add(ach_id)
+            self.pending[user_id].append(
+                {
+                    "user_id": user_id,
+                    "achievement_id": ach_id,
+                    "season": season,
+                    "date": date,
+                    "game_id": game_id,
+                }
+            )
+            return
         user_achievement = models.UserAchievement(
             user_id=user_id,
-            achievement_id=ach_id[0],
+            achievement_id=ach_id,
             season=season,
             date=date,
             game_id=game_id,
@@ -147,644 +229,124 @@ class Achievements:
     ##### ACH CHECKS #####
     ######################
 
-    async def user_played_total_time(
+    async def check_user_achievements(
         self,
         db: Session,
         user: models.User,
-        played_time: int,
-        date: str = None,
+        metrics: dict = None,
         silent: bool = False,
+        season: int = None,
     ):
-        # logger.debug("Check total played time achievements...")
-        if played_time is None:
-            return
-        played_time = played_time / 60 / 60
-        # To create messages, use the follow example, and adapt to every message
-        # user = user.name
-        # msg = AchievementsElems.PLAYED_100_HOURS.value["message"].format(name)
-        # 100 h
-        # logger.info("Check total played time achievements")
-        ach = AchievementsElems.PLAYED_100_HOURS
-        if played_time >= 100 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement 100h")
-            self.set_user_achievement(db, user.id, ach.name, date)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-
-        # 200 h
-        ach = AchievementsElems.PLAYED_200_HOURS
-        if played_time >= 200 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement 200h")
-            self.set_user_achievement(db, user.id, ach.name, date)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-
-        # 500 h
-        ach = AchievementsElems.PLAYED_500_HOURS
-        if played_time >= 500 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement 500h")
-            self.set_user_achievement(db, user.id, ach.name, date)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-
-        # 1000 h
-        ach = AchievementsElems.PLAYED_1000_HOURS
-        if played_time >= 1000 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement 1000h")
-            self.set_user_achievement(db, user.id, ach.name, date)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-
-    async def user_played_day_time(
-        self,
-        db: Session,
-        user: models.User,
-        silent: bool = False,
-    ):
-        # logger.debug("Check played time in one day achievements...")
-        played_days = time_entries.get_played_time_by_day(db, user.id)
-        for played_day in played_days:
-            date = str(played_day[0])
-            if played_day[1] is None:
+        """
+        Check every achievement rule for the user. Each metric is computed once
+        (or taken from metrics, by AchievementMetric) and only if one of its
+        rules is still locked
+        """
+        if season is None:
+            season = datetime.datetime.now().year
+        metrics = dict(metrics or {})
+        for rule in ACHIEVEMENT_RULES:
+            ach = rule.achievement
+            if self.check_already_achieved(db, user.id, ach.name, season):
                 continue
-            played_time = played_day[1] / 60 / 60
-            # 4 hours
-            ach = AchievementsElems.PLAYED_4_HOURS_DAY
-            if played_time >= 4 and not self.check_already_achieved(
-                db, user.id, ach.name
-            ):
-                logger.info("Set achievement 4 hours day")
-                self.set_user_achievement(db, user.id, ach.name, date=date)
-                msg = utils.get_ach_message(ach, user=user.name)
-                await utils.send_message(
-                    msg,
-                    silent,
-                    image=self.get_image(db, ach.name)[0],
-                )
-
-            # 8 hours
-            ach = AchievementsElems.PLAYED_8_HOURS_DAY
-            if played_time >= 8 and not self.check_already_achieved(
-                db, user.id, ach.name
-            ):
-                logger.info("Set achievement 8 hours day")
-                self.set_user_achievement(db, user.id, ach.name, date=date)
-                msg = utils.get_ach_message(ach, user=user.name)
-                await utils.send_message(
-                    msg,
-                    silent,
-                    image=self.get_image(db, ach.name)[0],
-                )
-
-            # 12 hour
-            ach = AchievementsElems.PLAYED_12_HOURS_DAY
-            if played_time >= 12 and not self.check_already_achieved(
-                db, user.id, ach.name
-            ):
-                logger.info("Set achievement 12 hours day")
-                self.set_user_achievement(db, user.id, ach.name, date=date)
-                msg = utils.get_ach_message(ach, user=user.name)
-                await utils.send_message(
-                    msg,
-                    silent,
-                    image=self.get_image(db, ach.name)[0],
-                )
-
-            # 16 hours
-            ach = AchievementsElems.PLAYED_16_HOURS_DAY
-            if played_time >= 16 and not self.check_already_achieved(
-                db, user.id, ach.name
-            ):
-                logger.info("Set achievement 16 hours day")
-                self.set_user_achievement(db, user.id, ach.name, date=date)
-                msg = utils.get_ach_message(ach, user=user.name)
-                await utils.send_message(
-                    msg,
-                    silent,
-                    image=self.get_image(db, ach.name)[0],
-                )
-
-    async def user_session_time(
-        self, db: Session, user: models.User, silent: bool = False
-    ):
-        # logger.debug("Check session played time achievements...")
-        # -5 min
-        ach = AchievementsElems.PLAYED_LESS_5_MIN_SESSION
-        if not self.check_already_achieved(db, user.id, ach.name):
-            time_entry = time_entries.get_time_entry_by_time(db, user.id, 5 * 60, 2)
-            if time_entry is not None and time_entry.duration > 0:
-                logger.info("Set achievement less 5 minutes session")
-                self.set_user_achievement(
-                    db,
-                    user.id,
-                    ach.name,
-                    game_id=time_entry.project_clockify_id,
-                    date=str(time_entry.start),
-                )
-                msg = utils.get_ach_message(
-                    ach,
-                    user=user.name,
-                    db=db,
-                    game_id=time_entry.project_clockify_id,
-                )
-                await utils.send_message(
-                    msg,
-                    silent,
-                    image=self.get_image(db, ach.name)[0],
-                )
-
-        # +4 hours
-        ach = AchievementsElems.PLAYED_4_HOURS_SESSION
-        if not self.check_already_achieved(db, user.id, ach.name):
-            time_entry = time_entries.get_time_entry_by_time(
-                db, user.id, 4 * 60 * 60, 3
-            )
-            if time_entry is not None:
-                logger.info("Set achievement 4 hours session")
-                self.set_user_achievement(
-                    db,
-                    user.id,
-                    ach.name,
-                    game_id=time_entry.project_clockify_id,
-                    date=str(time_entry.start),
-                )
-                msg = utils.get_ach_message(
-                    ach,
-                    user=user.name,
-                    db=db,
-                    game_id=time_entry.project_clockify_id,
-                )
-                await utils.send_message(
-                    msg,
-                    silent,
-                    image=self.get_image(db, ach.name)[0],
-                )
-
-        # +8 hours
-        ach = AchievementsElems.PLAYED_8_HOURS_SESSION
-        if not self.check_already_achieved(db, user.id, ach.name):
-            time_entry = time_entries.get_time_entry_by_time(
-                db, user.id, 8 * 60 * 60, 3
-            )
-            if time_entry is not None:
-                logger.info("Set achievement 8 hours session")
-                self.set_user_achievement(
-                    db,
-                    user.id,
-                    ach.name,
-                    game_id=time_entry.project_clockify_id,
-                    date=str(time_entry.start),
-                )
-                msg = utils.get_ach_message(
-                    ach,
-                    user=user.name,
-                    db=db,
-                    game_id=time_entry.project_clockify_id,
-                )
-                await utils.send_message(
-                    msg,
-                    silent,
-                    image=self.get_image(db, ach.name)[0],
-                )
-
-    async def user_played_total_days(
-        self, db: Session, user: models.User, total_days: list, silent: bool = False
-    ):
-        # logger.debug(
-        #    "Check total played days achievements (" + str(len(total_days)) + ")..."
-        # )
-        # achieved_date = total_days[1]
-        # 7 days
-        ach = AchievementsElems.PLAYED_7_DAYS
-        if len(total_days) >= 7 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement played 7 days")
-            # logger.info(total_days[6])
-            self.set_user_achievement(
-                db,
-                user.id,
-                ach.name,
-                date=str(total_days[6]),
-            )
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 15 days
-        ach = AchievementsElems.PLAYED_15_DAYS
-        if len(total_days) >= 15 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement played 15 days")
-            self.set_user_achievement(
-                db,
-                user.id,
-                ach.name,
-                date=str(total_days[14]),
-            )
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 30 days
-        ach = AchievementsElems.PLAYED_30_DAYS
-        if len(total_days) >= 30 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement played 30 days")
-            self.set_user_achievement(
-                db,
-                user.id,
-                ach.name,
-                date=str(total_days[29]),
-            )
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 60 days
-        ach = AchievementsElems.PLAYED_60_DAYS
-        if len(total_days) >= 60 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement played 60 days")
-            self.set_user_achievement(
-                db,
-                user.id,
-                ach.name,
-                date=str(total_days[59]),
-            )
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 100 days
-        ach = AchievementsElems.PLAYED_100_DAYS
-        if len(total_days) >= 100 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement played 100 days")
-            self.set_user_achievement(
-                db,
-                user.id,
-                ach.name,
-                date=str(total_days[99]),
-            )
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 200 days
-        ach = AchievementsElems.PLAYED_200_DAYS
-        if len(total_days) >= 200 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement played 200 days")
-            self.set_user_achievement(
-                db,
-                user.id,
-                ach.name,
-                date=str(total_days[199]),
-            )
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 300 days
-        ach = AchievementsElems.PLAYED_300_DAYS
-        if len(total_days) >= 300 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement played 300 days")
-            self.set_user_achievement(
-                db,
-                user.id,
-                ach.name,
-                date=str(total_days[299]),
-            )
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 365 days
-        ach = AchievementsElems.PLAYED_365_DAYS
-        if len(total_days) >= 365 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement played 365 days")
-            self.set_user_achievement(
-                db,
-                user.id,
-                ach.name,
-                date=str(total_days[364]),
-            )
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-
-    async def user_played_total_games(
-        self, db: Session, user: models.User, date: str = None, silent: bool = False
-    ):
-        # logger.debug("Check total played games achievements...")
-        played_games = users.get_games(db, user.id)
-        # 10
-        # logger.info("Played games for " + user.name + ": " + str(len(played_games)))
-        ach = AchievementsElems.PLAYED_10_GAMES
-        if len(played_games) >= 10 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement played 10 games")
-            self.set_user_achievement(db, user.id, ach.name)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 42
-        ach = AchievementsElems.PLAYED_42_GAMES
-        if len(played_games) >= 42 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement played 42 games")
-            self.set_user_achievement(db, user.id, ach.name)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 50
-        ach = AchievementsElems.PLAYED_50_GAMES
-        if len(played_games) >= 50 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement played 50 games")
-            self.set_user_achievement(db, user.id, ach.name)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 100
-        ach = AchievementsElems.PLAYED_100_GAMES
-        if len(played_games) >= 100 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement played 100 games")
-            self.set_user_achievement(db, user.id, ach.name)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-
-    async def user_played_hours_game(
-        self,
-        db: Session,
-        user: models.User,
-        game_id: str,
-        played_time: int,
-        date: str = None,
-        silent: bool = False,
-    ):
-        played_time = int(played_time / 60 / 60)
-        # 100 h
-        ach = AchievementsElems.PLAYED_100_HOURS_GAME
-        if played_time >= 100 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            game = games.get_game_by_id(db, game_id)
-            logger.info(
-                "Set achievement played 100 hours game: "
-                + game.name
-                + " ("
-                + str(played_time)
-                + ")"
-            )
-            self.set_user_achievement(db, user.id, ach.name, game_id)
-            msg = utils.get_ach_message(ach=ach, user=user.name, db=db, game_id=game_id)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-
-        # The following are not activated yet
-        # # 500 h
-        # ach = AchievementsElems.PLAYED_500_HOURS_GAME
-        # if played_time >= 500 and not self.check_already_achieved(
-        #     db, user.id, ach.name
-        # ):
-        #     game = games.get_game_by_id(db, game_id)
-        #     logger.info(
-        #         "Set achievement played 500 hours game: "
-        #         + game.name
-        #         + " ("
-        #         + str(played_time)
-        #         + ")"
-        #     )
-        #     self.set_user_achievement(db, user.id, ach.name, game_id)
-        #     msg = utils.get_ach_message(ach=ach, user=user.name, db=db, game_id=game_id)
-        #     await utils.send_message(
-        #         msg,
-        #         silent,
-        #         image=self.get_image(db, ach.name)[0],
-        #     )
-
-        # # 1000 h
-        # ach = AchievementsElems.PLAYED_1000_HOURS_GAME
-        # if played_time >= 1000 and not self.check_already_achieved(
-        #     db, user.id, ach.name
-        # ):
-        #     game = games.get_game_by_id(db, game_id)
-        #     logger.info(
-        #         "Set achievement played 1000 hours game: "
-        #         + game.name
-        #         + " ("
-        #         + str(played_time)
-        #         + ")"
-        #     )
-        #     self.set_user_achievement(db, user.id, ach.name, game_id)
-        #     msg = utils.get_ach_message(ach=ach, user=user.name, db=db, game_id=game_id)
-        #     await utils.send_message(
-        #         msg,
-        #         silent,
-        #         image=self.get_image(db, ach.name)[0],
-        #     )
-        return
-
-    async def happy_new_year(
-        self,
-        db: Session,
-        user: models.User,
-        silent: bool = False,
-        season: int = season,
-    ):
-        current_season = str(season)
-        new_year = current_season + "-01-01"
-        time_entry = time_entries.get_time_entry_by_date(db, user.id, new_year, 1)
-        ach = AchievementsElems.HAPPY_NEW_YEAR
-        if time_entry.count() > 0 and not self.check_already_achieved(
-            db, user.id, ach.name
-        ):
-            logger.info("Set achievement happy new year")
+            if rule.metric not in metrics:
+                for metric, value in self.get_metrics(
+                    db, user, rule.metric, season
+                ).items():
+                    metrics.setdefault(metric, value)
+            unlock = self.get_unlock(rule, metrics[rule.metric])
+            if unlock is None:
+                continue
+            date, game_id = unlock
+            logger.info("Set achievement " + ach.name + " for " + str(user.name))
             self.set_user_achievement(
-                db,
-                user.id,
-                ach.name,
-                date=str(time_entry[0].start),
+                db, user.id, ach.name, game_id=game_id, date=date, season=season
             )
-            msg = utils.get_ach_message(ach, user=user.name)
+            if rule.with_game:
+                msg = utils.get_ach_message(ach, user=user.name, db=db, game_id=game_id)
+            else:
+                msg = utils.get_ach_message(ach, user=user.name)
             await utils.send_message(
                 msg,
                 silent,
                 image=self.get_image(db, ach.name)[0],
             )
 
-    async def user_streak(
-        self,
-        db: Session,
-        user: models.User,
-        streak: int,
-        date: datetime.datetime = None,
-        silent: bool = False,
-    ):
-        # logger.debug("Check streaks achievements...")
-        if date is not None:
-            date = date.strftime("%Y-%m-%d %H:%M:%S")
-        # 7 days
-        ach = AchievementsElems.STREAK_7_DAYS
-        if streak >= 7 and not self.check_already_achieved(db, user.id, ach.name):
-            logger.info("Set achievement streak 7 days")
-            self.set_user_achievement(db, user.id, ach.name, date=date)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 15 days
-        ach = AchievementsElems.STREAK_15_DAYS
-        if streak >= 15 and not self.check_already_achieved(db, user.id, ach.name):
-            logger.info("Set achievement streak 15 days")
-            self.set_user_achievement(db, user.id, ach.name, date=date)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 30 days
-        ach = AchievementsElems.STREAK_30_DAYS
-        if streak >= 30 and not self.check_already_achieved(db, user.id, ach.name):
-            logger.info("Set achievement streak 30 days")
-            self.set_user_achievement(db, user.id, ach.name, date=date)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 60 days
-        ach = AchievementsElems.STREAK_60_DAYS
-        if streak >= 60 and not self.check_already_achieved(db, user.id, ach.name):
-            logger.info("Set achievement streak 60 days")
-            self.set_user_achievement(db, user.id, ach.name, date=date)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 100 days
-        ach = AchievementsElems.STREAK_100_DAYS
-        if streak >= 100 and not self.check_already_achieved(db, user.id, ach.name):
-            logger.info("Set achievement streak 100 days")
-            self.set_user_achievement(db, user.id, ach.name, date=date)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 200 days
-        ach = AchievementsElems.STREAK_200_DAYS
-        if streak >= 200 and not self.check_already_achieved(db, user.id, ach.name):
-            logger.info("Set achievement streak 200 days")
-            self.set_user_achievement(db, user.id, ach.name, date=date)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 300 days
-        ach = AchievementsElems.STREAK_300_DAYS
-        if streak >= 300 and not self.check_already_achieved(db, user.id, ach.name):
-            logger.info("Set achievement streak 300 days")
-            self.set_user_achievement(db, user.id, ach.name, date=date)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-        # 365 days
-        ach = AchievementsElems.STREAK_365_DAYS
-        if streak >= 365 and not self.check_already_achieved(db, user.id, ach.name):
-            logger.info("Set achievement streak 365 days")
-            self.set_user_achievement(db, user.id, ach.name, date=date)
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
+    def get_metrics(
+        self, db: Session, user: models.User, metric: AchievementMetric, season: int
+    ) -> dict:
+        """
+        Compute the metric. The ones from the time entries are computed all at
+        once, so all of them are returned
+        """
+        if metric == AchievementMetric.BEST_STREAK:
+            user_statistics = users.get_user_statistics(db, user.id)
+            if user_statistics is None:
+                return {metric: (0, None)}
+            return {
+                metric: (
+                    user_statistics.best_streak or 0,
+                    user_statistics.best_streak_date,
+                )
+            }
+        elif metric == AchievementMetric.PLAYED_GAMES:
+            return {
+                metric: users.count_played_games(db, user.id, season, distinct=True)
+            }
+        return get_user_metrics(db, user.id, season).get_achievement_metrics()
+
+    def get_unlock(self, rule: AchievementRule, value):
+        """
+        Test the rule against its metric value.
+        Returns None if not reached, or (date, game_id) of the unlock
+        """
+        metric = rule.metric
+        threshold = rule.threshold
+        if metric == AchievementMetric.PLAYED_TIME:
+            if value is not None and value / 60 / 60 >= threshold:
+                return None, None
+        elif metric == AchievementMetric.PLAYED_DAYS:
+            # (played days, last played days)
+            played_days, last_days = value
+            if played_days >= threshold and len(last_days) > 0:
+                index = threshold - 1 - (played_days - len(last_days))
+                return str(last_days[max(index, 0)]), None
+        elif metric == AchievementMetric.BEST_STREAK:
+            streak, date = value
+            if streak >= threshold:
+                if date is not None:
+                    date = date.strftime("%Y-%m-%d %H:%M:%S")
+                return date, None
+        elif metric == AchievementMetric.PLAYED_GAMES:
+            if value >= threshold:
+                return None, None
+        elif metric == AchievementMetric.GAME_PLAYED_TIME:
+            for game_id, played_time in value:
+                if played_time is not None and played_time >= threshold * 60 * 60:
+                    return None, game_id
+        elif metric == AchievementMetric.DAY_PLAYED_TIME:
+            for day, played_time in value:
+                if played_time is not None and played_time >= threshold * 60 * 60:
+                    return str(day), None
+        elif metric == AchievementMetric.MIN_SESSION:
+            for time_entry in value:
+                if 0 < time_entry.duration <= threshold * 60:
+                    return str(time_entry.start), time_entry.project_clockify_id
+        elif metric == AchievementMetric.MAX_SESSION:
+            for time_entry in value:
+                if time_entry.duration >= threshold * 60 * 60:
+                    return str(time_entry.start), time_entry.project_clockify_id
+        elif metric == AchievementMetric.SESSION_START_HOUR:
+            start_hour, end_hour = threshold
+            starts = [
+                start for hour, start in value.items() if start_hour <= hour < end_hour
+            ]
+            if len(starts) > 0:
+                return str(min(starts)), None
+        elif metric == AchievementMetric.NEW_YEAR_SESSION:
+            if value is not None:
+                return str(value.start), None
+        return None
 
     async def teamwork(self, db: Session, silent: bool):
         # logger.debug("Checking teamwork achievement...")
@@ -821,48 +383,6 @@ class Achievements:
             else:
                 logger.info("All users unlocked this achievement")
 
-    async def early_riser(self, db: Session, user: models.User, silent: bool):
-        # logger.debug("Checking early riser achievement...")
-        entries = time_entries.get_time_entry_between_hours(
-            db, user.id, start_hour=5, end_hour=6
-        )
-        ach = AchievementsElems.EARLY_RISER
-        if len(entries) > 0 and not self.check_already_achieved(db, user.id, ach.name):
-            logger.info("Set achievement early riser")
-            self.set_user_achievement(
-                db,
-                user.id,
-                ach.name,
-                date=str(entries[0].start),
-            )
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-
-    async def nocturnal(self, db: Session, user: models.User, silent: bool):
-        # logger.debug("Checking nocturnal achievement...")
-        entries = time_entries.get_time_entry_between_hours(
-            db, user.id, start_hour=2, end_hour=5
-        )
-        ach = AchievementsElems.NOCTURNAL
-        if len(entries) > 0 and not self.check_already_achieved(db, user.id, ach.name):
-            logger.info("Set achievement nocturnal")
-            self.set_user_achievement(
-                db,
-                user.id,
-                ach.name,
-                date=str(entries[0].start),
-            )
-            msg = utils.get_ach_message(ach, user=user.name)
-            await utils.send_message(
-                msg,
-                silent,
-                image=self.get_image(db, ach.name)[0],
-            )
-
     def get_weekly_achievements(
         self, db: Session, user: models.User, weeks_ago: int = 0
     ):
@@ -1,3 +1,5 @@
+import threading
+
 import requests
 from sqlalchemy import asc, create_engine, desc, func, select, text, update
 from sqlalchemy.orm import Session
@@ -17,9 +19,50 @@ clockify = ClockifyApi()
 config = Config()
 
 
+# Platform and other (Completed/Retired) tags, keyed by tag ID. Both tables are
+# tiny, so they are loaded once per sync and reloaded when new tags are added.
+tag_catalogue = None
+tag_catalogue_lock = threading.Lock()
+
+
+def load_tag_catalogue(db: Session, force: bool = False) -> dict:
+    global tag_catalogue
+    with tag_catalogue_lock:
+        if tag_catalogue is None or force:
+            tag_catalogue = {
+                "platforms": dict(
+                    db.query(models.PlatformTag.id, models.PlatformTag.name).all()
+                ),
+                "others": dict(
+                    db.query(models.OtherTag.id, models.OtherTag.name).all()
+                ),
+            }
+        return tag_catalogue
+
+
+def classify_tags(db: Session, tag_ids: list[str]):
+    """
+    Get the platform (first platform tag) and the completed flag (1 if any
+    Completed/Retired tag) for the tags of a time entry
+    """
+    catalogue = load_tag_catalogue(db)
+    platform = None
+    completed = None
+    for tag in tag_ids or []:
+        if completed is None and tag in catalogue["others"]:
+            completed = 1
+        if platform is None and tag in catalogue["platforms"]:
+            platform = tag
+    return platform, completed
+
+
 def sync_clockify_tags(db: Session):
     tags = clockify.get_tags()
+    catalogue = load_tag_catalogue(db, force=True)
+    new_tags = 0
     for tag in tags:
+        if tag["id"] in catalogue["platforms"] or tag["id"] in catalogue["others"]:
+            continue
         try:
             if "tracker" not in tag["name"]:
                 if "Completed" not in tag["name"] and "Retired" not in tag["name"]:
@@ -30,8 +73,11 @@ def sync_clockify_tags(db: Session):
                     new_tag = models.OtherTag(id=tag["id"], name=tag["name"])
                     db.add(new_tag)
                     db.commit()
+                new_tags += 1
         except Exception:
             db.rollback()
+    if new_tags > 0:
+        load_tag_catalogue(db, force=True)
 
 
 def get_platform_by_tag_id(db: Session, tag_id):
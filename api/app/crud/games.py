@@ -2,10 +2,23 @@ import datetime
 from typing import Union
 import random
 
-from sqlalchemy import asc, create_engine, delete, desc, func, select, text, update, or_
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import (
+    asc,
+    case,
+    create_engine,
+    delete,
+    desc,
+    func,
+    or_,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.orm import Session
 
+from ..config import Config
 from ..database import models, schemas
 from ..utils import actions
 from ..utils import actions as actions
@@ -17,6 +30,7 @@ log_manager = LogManager()
 logger = log_manager.get_logger()
 
 clockify_api = ClockifyApi()
+config = Config()
 
 #################
 ##### GAMES #####
@@ -75,7 +89,7 @@ async def new_game(db: Session, game: schemas.NewGame) -> models.Game:
         logger.info("No clockify ID. Adding to clockify...")
         clockify_id = clockify_api.add_project(game.name)["id"]
         new_game = {"name": game.name, "id": clockify_id}
-        game_info = await utils.get_new_game_info(new_game)
+        game_info = await utils.get_new_game_info(new_game, db)
         game_to_add = models.Game(
             id=clockify_id,
             name=game_info.name,
@@ -225,6 +239,32 @@ def update_total_played_time(db: Session, game_id, total_played):
         raise e
 
 
+def update_total_played_times(
+    db: Session, played_times: list[tuple], commit: bool = True
+):
+    """Set the played time of many games (game_id, time) in one UPDATE"""
+    if len(played_times) == 0:
+        return
+    try:
+        played_times = dict(played_times)
+        stmt = (
+            update(models.GameStatistics)
+            .where(models.GameStatistics.game_id.in_(list(played_times)))
+            .values(
+                played_time=case(played_times, value=models.GameStatistics.game_id)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(stmt)
+        if commit:
+            db.commit()
+    except Exception as e:
+        if commit:
+            db.rollback()
+        logger.info("Error updating games played time: " + str(e))
+        raise e
+
+
 def get_most_played_time(db: Session, limit: int = None) -> list[models.GameStatistics]:
     if limit is not None:
         return (
@@ -249,6 +289,32 @@ def current_ranking_hours(db: Session, limit: int = 11) -> list[models.GameStati
         logger.info(e)
 
 
+def update_current_rankings_hours(
+    db: Session, rankings: list[tuple], commit: bool = True
+):
+    """Set the current ranking of many games (game_id, ranking) in one UPDATE"""
+    if len(rankings) == 0:
+        return
+    try:
+        rankings = dict(rankings)
+        stmt = (
+            update(models.GameStatistics)
+            .where(models.GameStatistics.game_id.in_(list(rankings)))
+            .values(
+                current_ranking=case(rankings, value=models.GameStatistics.game_id)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(stmt)
+        if commit:
+            db.commit()
+    except SQLAlchemyError as e:
+        if commit:
+            db.rollback()
+        logger.error("Error updating games current ranking: " + str(e))
+        raise
+
+
 def update_current_ranking_hours(db: Session, i, game_id):
     try:
         stmt = (
@@ -262,3 +328,195 @@ def update_current_ranking_hours(db: Session, i, game_id):
         logger.info(
             "Error updating current ranking for game " + str(game_id) + ". " + str(e)
         )
+
+
+#######################
+### GAME ENRICHMENT ###
+#######################
+
+
+def add_placeholder_game(db: Session, project_id: str, name: str) -> models.Game:
+    """
+    Add a game from a Clockify project with only its name, and queue it to get
+    the rest of its info (RAWG/HLTB) on the worker. If another game already has
+    the name (unique, case insensitive), the project id is added to its name
+    """
+    try:
+        now = datetime.datetime.now()
+        for game_name in [name, name[:200] + " (" + project_id + ")"]:
+            result = db.execute(
+                mysql_insert(models.Game)
+                .prefix_with("IGNORE")
+                .values(id=project_id, name=game_name)
+            )
+            # Ignored if the game was just added (by another sync) or the
+            # name is taken
+            if result.rowcount > 0 or get_game_by_id(db, project_id) is not None:
+                break
+        else:
+            raise Exception("Name of game " + project_id + " already exists")
+        db.execute(
+            mysql_insert(models.GameEnrichment)
+            .prefix_with("IGNORE")
+            .values(
+                game_id=project_id,
+                status="pending",
+                attempts=0,
+                created_at=now,
+                run_after=now,
+            )
+        )
+        db.commit()
+        return get_game_by_id(db, project_id)
+    except Exception as e:
+        db.rollback()
+        logger.error("Error adding placeholder game: " + str(e))
+        raise
+
+
+def claim_next_enrichment(db: Session) -> models.GameEnrichment:
+    """Get the oldest pending game enrichment and count the attempt"""
+    try:
+        enrichment = (
+            db.query(models.GameEnrichment)
+            .filter(models.GameEnrichment.status == "pending")
+            .filter(models.GameEnrichment.run_after <= datetime.datetime.now())
+            .order_by(models.GameEnrichment.run_after)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if enrichment is None:
+            db.commit()
+            return None
+        enrichment.attempts = (enrichment.attempts or 0) + 1
+        # Retried later if the worker stops while running it
+        enrichment.run_after = datetime.datetime.now() + datetime.timedelta(hours=1)
+        db.commit()
+        db.refresh(enrichment)
+        return enrichment
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Error claiming game enrichment: " + str(e))
+        raise
+
+
+def finish_enrichment(
+    db: Session, enrichment: models.GameEnrichment, error: str = None, retry=True
+):
+    """
+    Mark the enrichment as done, or retry it with exponential backoff (up to
+    GAME_ENRICHMENT_MAX_ATTEMPTS, if retry) on error
+    """
+    try:
+        if error is None:
+            enrichment.status = "done"
+        elif retry and enrichment.attempts < config.GAME_ENRICHMENT_MAX_ATTEMPTS:
+            enrichment.status = "pending"
+            enrichment.run_after = datetime.datetime.now() + datetime.timedelta(
+                minutes=2**enrichment.attempts
+            )
+        else:
+            enrichment.status = "failed"
+        enrichment.error = error[:255] if error is not None else None
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Error finishing game enrichment: " + str(e))
+        raise
+
+
+def enrich_game(db: Session, game_id: str, game_info: schemas.NewGame):
+    """Add the RAWG/HLTB info to a game added from Clockify"""
+    values = dict(
+        dev=game_info.dev,
+        steam_id=game_info.steam_id,
+        image_url=game_info.image_url,
+        release_date=game_info.release_date,
+        genres=game_info.genres,
+        avg_time=game_info.avg_time,
+        slug=game_info.slug,
+    )
+    stmt = update(models.Game).where(models.Game.id == game_id)
+    try:
+        try:
+            with db.begin_nested():
+                db.execute(stmt.values(name=game_info.name, **values))
+        except IntegrityError:
+            # The RAWG name is already used by another game, keep the current
+            db.execute(stmt.values(**values))
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Error enriching game " + str(game_id) + ": " + str(e))
+        raise
+
+
+##################
+### RAWG CACHE ###
+##################
+
+
+def get_rawg_cache(db: Session, query: str) -> models.RawgCache:
+    """
+    Get the cached RAWG search result, if fetched within RAWG_CACHE_DAYS, and
+    mark it as used
+    """
+    now = datetime.datetime.now()
+    cached = (
+        db.query(models.RawgCache)
+        .filter(models.RawgCache.query == query)
+        .filter(
+            models.RawgCache.fetched_at
+            >= now - datetime.timedelta(days=config.RAWG_CACHE_DAYS)
+        )
+        .first()
+    )
+    # Usage is tracked by hour, so most hits do not write
+    if cached is not None and (
+        cached.last_used_at is None
+        or cached.last_used_at < now - datetime.timedelta(hours=1)
+    ):
+        try:
+            cached.last_used_at = now
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error("Error updating RAWG cache: " + str(e))
+    return cached
+
+
+def save_rawg_cache(db: Session, query: str, response):
+    """
+    Cache a RAWG search result, evicting the expired and least recently used
+    searches over RAWG_CACHE_MAX_ENTRIES
+    """
+    try:
+        now = datetime.datetime.now()
+        stmt = mysql_insert(models.RawgCache).values(
+            query=query, response=response, fetched_at=now, last_used_at=now
+        )
+        stmt = stmt.on_duplicate_key_update(
+            response=stmt.inserted.response,
+            fetched_at=stmt.inserted.fetched_at,
+            last_used_at=stmt.inserted.last_used_at,
+        )
+        db.execute(stmt)
+        db.query(models.RawgCache).filter(
+            models.RawgCache.fetched_at
+            < now - datetime.timedelta(days=config.RAWG_CACHE_DAYS)
+        ).delete(synchronize_session=False)
+        evicted = [
+            row[0]
+            for row in db.query(models.RawgCache.query)
+            .order_by(desc(models.RawgCache.last_used_at))
+            .offset(config.RAWG_CACHE_MAX_ENTRIES)
+            .all()
+        ]
+        if len(evicted) > 0:
+            db.query(models.RawgCache).filter(
+                models.RawgCache.query.in_(evicted)
+            ).delete(synchronize_session=False)
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Error saving RAWG cache: " + str(e))
@@ -1,7 +1,9 @@
 import datetime
 from typing import Union
 
-from sqlalchemy import asc, create_engine, desc, func, select, text, update
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import asc, create_engine, desc, func, insert, select, text, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from ..crud import users
@@ -16,12 +18,73 @@ log_manager = LogManager()
 logger = log_manager.get_logger()
 config = Config()
 clockify = ClockifyApi()
-current_season = datetime.datetime.now().year
 
 ####################
 ##### RANKINGS #####
 ####################
 
+RANKING_TYPES = [
+    "user_hours",
+    "user_days",
+    "user_played_games",
+    "user_completed_games",
+    "achievements",
+    "user_ratio",
+    "user_current_streak",
+    "user_best_streak",
+    "games_most_played",
+    "platform_played",
+    "debt",
+    "games_last_played",
+]
+
+
+# Times a snapshot is retried when another writer takes its version
+SNAPSHOT_MAX_ATTEMPTS = 3
+
+# Field with the value of each ranking row (for the snapshots)
+RANKING_VALUES = {
+    "user_hours": "played_time",
+    "user_days": "played_days",
+    "user_played_games": "played_games",
+    "user_completed_games": "completed_games",
+    "achievements": "achievements",
+    "user_ratio": "ratio",
+    "user_current_streak": "current_streak",
+    "user_best_streak": "best_streak",
+    "games_most_played": "played_time",
+    "platform_played": "count_1",
+}
+
+
+def get_ranking(db: Session, ranking_type: str):
+    """Get the data of a ranking by its type (see RANKING_TYPES)"""
+    if ranking_type == "user_hours":
+        return user_hours_players(db)
+    elif ranking_type == "user_days":
+        return user_days_played(db)
+    elif ranking_type == "user_played_games":
+        return user_played_games(db)
+    elif ranking_type == "user_completed_games":
+        return user_completed_games(db)
+    elif ranking_type == "achievements":
+        return user_ranking_achievements(db)
+    elif ranking_type == "user_ratio":
+        return user_ratio(db)
+    elif ranking_type == "user_current_streak":
+        return user_current_streak(db)
+    elif ranking_type == "user_best_streak":
+        return user_best_streak(db)
+    elif ranking_type == "games_most_played":
+        return games_most_played(db)
+    elif ranking_type == "platform_played":
+        return platform_played_games(db)
+    elif ranking_type == "debt":
+        return [{"message": "Debt is not implemented yet"}]
+    elif ranking_type == "games_last_played":
+        return games_last_played(db)
+    return {"message": "More rankings are coming"}
+
 
 def user_hours_players(
     db: Session, limit: int = None, is_active: bool | None = True
@@ -140,9 +203,11 @@ def user_current_streak(db: Session, limit: int = None, is_active: bool | None =
 def user_ranking_achievements(
     db: Session,
     limit: int = None,
-    season: int = current_season,
+    season: int = None,
     is_active: bool | None = True,
 ):
+    if season is None:
+        season = datetime.datetime.now().year
     try:
         stmt = (
             select(
@@ -167,9 +232,11 @@ def user_ranking_achievements(
 def user_played_games(
     db: Session,
     limit: int = None,
-    season: int = current_season,
+    season: int = None,
     is_active: bool | None = True,
 ):
+    if season is None:
+        season = datetime.datetime.now().year
     try:
         stmt = (
             select(
@@ -199,9 +266,11 @@ def user_played_games(
 def user_completed_games(
     db: Session,
     limit: int = None,
-    season: int = current_season,
+    season: int = None,
     is_active: bool | None = True,
 ):
+    if season is None:
+        season = datetime.datetime.now().year
     try:
         user_list = users.get_users(db, is_active=is_active)
         data = []
@@ -326,9 +395,9 @@ def platform_played_games(db: Session, limit: int = None):
         raise e
 
 
-def user_ratio(
-    db: Session, season: int = current_season, is_active: bool | None = True
-):
+def user_ratio(db: Session, season: int = None, is_active: bool | None = True):
+    if season is None:
+        season = datetime.datetime.now().year
     try:
         user_list = users.get_users(db, is_active=is_active)
         data = []
@@ -368,3 +437,86 @@ def user_ratio(
     except Exception as e:
         logger.error("Error calculating user ratio: " + str(e))
         raise e
+
+
+def get_latest_snapshot_version(db: Session, season: int = None) -> int:
+    if season is None:
+        season = datetime.datetime.now().year
+    return (
+        db.query(func.max(models.RankingSnapshot.version))
+        .filter(models.RankingSnapshot.season == season)
+        .scalar()
+    )
+
+
+def get_ranking_snapshots(db: Session, version: int, season: int = None) -> dict:
+    """Get the rankings data of a snapshot version, by ranking type"""
+    if season is None:
+        season = datetime.datetime.now().year
+    snapshot = (
+        db.query(models.RankingSnapshot.ranking_type, models.RankingSnapshot.data)
+        .filter(
+            models.RankingSnapshot.season == season,
+            models.RankingSnapshot.version == version,
+        )
+        .order_by(asc(models.RankingSnapshot.position))
+        .all()
+    )
+    data = {}
+    for ranking_type, item in snapshot:
+        data.setdefault(ranking_type, []).append(item)
+    return data
+
+
+def write_ranking_snapshots(db: Session, season: int = None) -> int:
+    """
+    Compute every ranking and write them as a new snapshot version, unless
+    nothing changed since the latest one. Returns the latest version. If
+    another writer takes the version first, it is retried with the next one
+    """
+    if season is None:
+        season = datetime.datetime.now().year
+    computed = {}
+    for ranking_type in RANKING_TYPES:
+        computed[ranking_type] = jsonable_encoder(get_ranking(db, ranking_type))
+    attempts = 0
+    while True:
+        version = get_latest_snapshot_version(db, season)
+        if version is not None:
+            latest = get_ranking_snapshots(db, version, season)
+            if all(computed[key] == latest.get(key, []) for key in computed):
+                return version
+
+        version = (version or 0) + 1
+        computed_at = datetime.datetime.now()
+        rows = []
+        for ranking_type, data in computed.items():
+            for position, item in enumerate(data, start=1):
+                value = item.get(RANKING_VALUES.get(ranking_type))
+                rows.append(
+                    {
+                        "version": version,
+                        "ranking_type": ranking_type,
+                        "season": season,
+                        "position": position,
+                        "subject": item.get("name"),
+                        "value": value if isinstance(value, (int, float)) else None,
+                        "data": item,
+                        "computed_at": computed_at,
+                    }
+                )
+        try:
+            db.execute(insert(models.RankingSnapshot), rows)
+            db.commit()
+            return version
+        except IntegrityError as e:
+            db.rollback()
+            attempts += 1
+            if attempts >= SNAPSHOT_MAX_ATTEMPTS:
+                logger.error("Error writing ranking snapshots: " + str(e))
+                raise e
+            logger.info("Ranking snapshot version " + str(version) + " taken")
+        except Exception as e:
+            db.rollback()
+            logger.error("Error writing ranking snapshots: " + str(e))
+            raise e
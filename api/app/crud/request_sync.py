@@ -1,5 +1,9 @@
+import datetime
+import uuid
+
 import requests
-from sqlalchemy import asc, create_engine, desc, func, select, text, update
+from sqlalchemy import asc, create_engine, desc, func, or_, select, text, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.orm import Session
 
 from ..config import Config
@@ -63,3 +67,174 @@ def delete_request_from_queue(db: Session, request_id: str):
         raise
 
     return True
+
+
+##################
+#### SYNC JOBS ###
+##################
+
+
+def merge_sync_entries(
+    entries: list, deleted: list, new_entries: list, new_deleted: list
+) -> dict:
+    """
+    Entries of a pending sync job with the ones of a new request: the last
+    version of every entry, without the deleted ones
+    """
+    merged = {entry["id"]: entry for entry in entries}
+    merged.update({entry["id"]: entry for entry in new_entries})
+    for entry_id in new_deleted:
+        merged.pop(entry_id, None)
+    deleted = [entry_id for entry_id in deleted if entry_id not in merged]
+    deleted += [entry_id for entry_id in new_deleted if entry_id not in deleted]
+    return {"entries": list(merged.values()), "deleted": deleted}
+
+
+def enqueue_sync(
+    db: Session, params: dict, request_id: str = None, delay: int = 0
+):
+    """
+    Add a sync job (params are actions.sync_data arguments), to run after
+    delay seconds. If the same sync is already pending, returns that job
+    instead, so all the requests until it runs are coalesced into it (adding
+    its Clockify entries and removing its deleted ones, if any). Pending jobs
+    are locked until the merge is committed, and the ones locked by the worker
+    (being claimed) are skipped, so changes are never merged into a running job
+    """
+    try:
+        pending = (
+            db.query(models.RequestSync)
+            .filter(models.RequestSync.status == "pending")
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        new_params = dict(params)
+        new_entries = new_params.pop("entries", None)
+        new_deleted = new_params.pop("deleted", [])
+        for job in pending:
+            job_params = dict(job.params)
+            job_entries = job_params.pop("entries", None)
+            job_deleted = job_params.pop("deleted", [])
+            if job_params != new_params or (job_entries is None) != (
+                new_entries is None
+            ):
+                continue
+            if new_entries or new_deleted:
+                job.params = dict(
+                    job_params,
+                    **merge_sync_entries(
+                        job_entries, job_deleted, new_entries, new_deleted
+                    ),
+                )
+            db.commit()
+            return job
+        now = datetime.datetime.now()
+        job = models.RequestSync(
+            request_id=request_id or uuid.uuid4().hex,
+            status="pending",
+            params=params,
+            attempts=0,
+            created_at=now,
+            run_after=now + datetime.timedelta(seconds=delay),
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Error adding sync job: " + str(e))
+        raise
+
+
+def claim_next_sync(db: Session) -> models.RequestSync:
+    """Get the oldest pending job and mark it as running"""
+    try:
+        job = (
+            db.query(models.RequestSync)
+            .filter(models.RequestSync.status == "pending")
+            .filter(
+                or_(
+                    models.RequestSync.run_after.is_(None),
+                    models.RequestSync.run_after <= datetime.datetime.now(),
+                )
+            )
+            .order_by(models.RequestSync.id)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            db.commit()
+            return None
+        job.status = "running"
+        job.attempts = (job.attempts or 0) + 1
+        job.started_at = datetime.datetime.now()
+        db.commit()
+        db.refresh(job)
+        return job
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Error claiming sync job: " + str(e))
+        raise
+
+
+def finish_sync(db: Session, job: models.RequestSync, error: str = None):
+    """
+    Mark the job as done, or retry it with exponential backoff (up to
+    SYNC_JOB_MAX_ATTEMPTS) on error
+    """
+    try:
+        if error is None:
+            job.status = "done"
+        elif job.attempts < config.SYNC_JOB_MAX_ATTEMPTS:
+            job.status = "pending"
+            job.run_after = datetime.datetime.now() + datetime.timedelta(
+                minutes=2**job.attempts
+            )
+        else:
+            job.status = "failed"
+        job.error = error[:255] if error is not None else None
+        job.finished_at = datetime.datetime.now()
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Error finishing sync job: " + str(e))
+        raise
+
+
+def requeue_running_syncs(db: Session):
+    """Put back the jobs left running by a stopped worker"""
+    try:
+        db.query(models.RequestSync).filter(
+            models.RequestSync.status == "running"
+        ).update({"status": "pending"})
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Error requeuing sync jobs: " + str(e))
+        raise
+
+
+def register_webhook_event(db: Session, event_id: str, commit: bool = True) -> bool:
+    """
+    Save a received webhook event. Returns False if it was already received
+    (events older than one day are forgotten). Without commit, it is saved
+    with the changes of the event
+    """
+    try:
+        now = datetime.datetime.now()
+        db.query(models.WebhookEvent).filter(
+            models.WebhookEvent.received_at < now - datetime.timedelta(days=1)
+        ).delete(synchronize_session=False)
+        result = db.execute(
+            mysql_insert(models.WebhookEvent)
+            .prefix_with("IGNORE")
+            .values(event_id=event_id, received_at=now)
+        )
+        if commit:
+            db.commit()
+        return result.rowcount > 0
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Error registering webhook event: " + str(e))
+        raise
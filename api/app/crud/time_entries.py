@@ -7,11 +7,13 @@ from sqlalchemy import (
     desc,
     extract,
     func,
+    insert,
     or_,
     select,
     text,
     update,
 )
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.orm import Session
 
 from ..config import Config
@@ -19,6 +21,8 @@ from ..database import models, schemas
 from ..utils import actions
 from ..utils import actions as actions
 from ..utils import my_utils as utils
+from ..utils.change_set import ChangeSet
+from ..utils.statistics_rows import statistics_rows
 from ..utils.clockify_api import ClockifyApi
 from . import clockify, games, users
 from ..utils.logger import LogManager
@@ -28,19 +32,22 @@ logger = log_manager.get_logger()
 
 clockify_api = ClockifyApi()
 config = Config()
-current_season = datetime.datetime.now().year
 
 
-def get_users_played_time(db: Session, season: int = current_season):
+def get_users_played_time(db: Session, season: int = None):
+    if season is None:
+        season = datetime.datetime.now().year
     stmt = (
         select(models.TimeEntry.user_id, func.sum(models.TimeEntry.duration))
-        .where(extract("year", models.TimeEntry.start) == season)
+        .where(utils.in_season(models.TimeEntry.start, season))
         .group_by(models.TimeEntry.user_id)
     )
     return db.execute(stmt)
 
 
-def get_user_played_time(db: Session, user_id: str, season: int = current_season):
+def get_user_played_time(db: Session, user_id: str, season: int = None):
+    if season is None:
+        season = datetime.datetime.now().year
     stmt = (
         select(
             models.TimeEntry.user_id,
@@ -48,7 +55,7 @@ def get_user_played_time(db: Session, user_id: str, season: int = current_season
         )
         .where(
             models.TimeEntry.user_id == user_id,
-            extract("year", models.TimeEntry.start) == season,
+            utils.in_season(models.TimeEntry.start, season),
         )
         .group_by(models.TimeEntry.user_id)
     )
@@ -56,19 +63,26 @@ def get_user_played_time(db: Session, user_id: str, season: int = current_season
 
 
 def get_games_played_time(
-    db: Session, season: int = current_season, is_active: bool = True
+    db: Session,
+    season: int = None,
+    is_active: bool = True,
+    game_ids: list[str] = None,
 ):
+    if season is None:
+        season = datetime.datetime.now().year
     stmt = (
         select(
             models.TimeEntry.project_clockify_id, func.sum(models.TimeEntry.duration)
         )
         .join(models.User, models.TimeEntry.user_id == models.User.id)
         .where(
-            extract("year", models.TimeEntry.start) == season,
+            utils.in_season(models.TimeEntry.start, season),
             models.User.is_active == is_active,
         )
         .group_by(models.TimeEntry.project_clockify_id)
     )
+    if game_ids is not None:
+        stmt = stmt.where(models.TimeEntry.project_clockify_id.in_(game_ids))
     result = db.execute(stmt)
     return result
 
@@ -114,8 +128,10 @@ def get_time_entry_by_date(
 
 
 def get_user_games_played_time(
-    db: Session, user_id: str, game_id: str = None, season: int = current_season
+    db: Session, user_id: str, game_id: str = None, season: int = None
 ) -> list[models.TimeEntry]:
+    if season is None:
+        season = datetime.datetime.now().year
     if game_id is not None:
         return (
             db.query(
@@ -124,7 +140,7 @@ def get_user_games_played_time(
             )
             .filter(
                 models.TimeEntry.user_id == user_id,
-                extract("year", models.TimeEntry.start) == season,
+                utils.in_season(models.TimeEntry.start, season),
             )
             .filter(models.TimeEntry.project_clockify_id == game_id)
             .group_by(models.TimeEntry.project_clockify_id)
@@ -138,16 +154,44 @@ def get_user_games_played_time(
             )
             .filter(
                 models.TimeEntry.user_id == user_id,
-                extract("year", models.TimeEntry.start) == season,
+                utils.in_season(models.TimeEntry.start, season),
             )
             .group_by(models.TimeEntry.project_clockify_id)
             .all()
         )
 
 
+def get_users_season_entries(db: Session, user_ids: list[int], season: int = None):
+    """
+    Get the time entries of the users on the season (plus the last day of the
+    previous one, for the sessions ending on new year), by user and start
+    """
+    if season is None:
+        season = datetime.datetime.now().year
+    start, end = utils.season_range(season)
+    stmt = (
+        select(
+            models.TimeEntry.user_id,
+            models.TimeEntry.project_clockify_id,
+            models.TimeEntry.start,
+            models.TimeEntry.end,
+            models.TimeEntry.duration,
+        )
+        .where(
+            models.TimeEntry.user_id.in_(user_ids),
+            models.TimeEntry.start >= start - datetime.timedelta(days=1),
+            models.TimeEntry.start < end,
+        )
+        .order_by(models.TimeEntry.user_id, models.TimeEntry.start)
+    )
+    return db.execute(stmt).all()
+
+
 def get_time_entries(
-    db: Session, start_date: str = None, season: int = current_season
+    db: Session, start_date: str = None, season: int = None
 ) -> list[models.TimeEntry]:
+    if season is None:
+        season = datetime.datetime.now().year
     if start_date:
         # logger.debug(start_date)
         return (
@@ -158,7 +202,7 @@ def get_time_entries(
     else:
         return (
             db.query(models.TimeEntry)
-            .filter(extract("year", models.TimeEntry.start) == season)
+            .filter(utils.in_season(models.TimeEntry.start, season))
             .order_by(models.TimeEntry.user_id)
         )
 
@@ -167,8 +211,10 @@ def get_time_entries_by_user(
     db: Session,
     user_id: int,
     start_date: str = None,
-    season: int = current_season,
+    season: int = None,
 ) -> list[models.TimeEntry]:
+    if season is None:
+        season = datetime.datetime.now().year
     if start_date:
         # logger.debug(start_date)
         return db.query(models.TimeEntry).filter(
@@ -181,7 +227,7 @@ def get_time_entries_by_user(
             db.query(models.TimeEntry)
             .filter(
                 models.TimeEntry.user_id == user_id,
-                extract("year", models.TimeEntry.start) == season,
+                utils.in_season(models.TimeEntry.start, season),
             )
             .order_by(models.TimeEntry.project_clockify_id)
             .all()
@@ -194,8 +240,10 @@ def get_played_days(
     user_id: int,
     start_date: str = None,
     end_date: str = None,
-    season: int = current_season,
+    season: int = None,
 ) -> list[models.TimeEntry]:
+    if season is None:
+        season = datetime.datetime.now().year
     played_days = []
     real_played_days = []
     if start_date is None:
@@ -204,13 +252,12 @@ def get_played_days(
     if end_date is None:
         end_date = "3000-12-31"
     played_start_days = (
-        db.query(func.DATE(models.TimeEntry.start))
-        .filter(models.TimeEntry.user_id == user_id)
-        .filter(func.DATE(models.TimeEntry.start) >= start_date)
-        .filter(func.DATE(models.TimeEntry.start) <= end_date)
-        .filter(extract("year", models.TimeEntry.start) == season)
-        .filter(models.TimeEntry.duration >= 600)
-        # .filter(or_(models.TimeEntry.duration >= 600, models.TimeEntry.duration == None))
+        db.query(models.TimeEntryDaily.day)
+        .filter(models.TimeEntryDaily.user_id == user_id)
+        .filter(models.TimeEntryDaily.day >= start_date)
+        .filter(models.TimeEntryDaily.day <= end_date)
+        .filter(utils.in_season(models.TimeEntryDaily.day, season))
+        .filter(models.TimeEntryDaily.longest_session >= 600)
         .distinct()
         .all()
     )
@@ -219,7 +266,7 @@ def get_played_days(
         .filter(models.TimeEntry.user_id == user_id)
         .filter(func.DATE(models.TimeEntry.end) >= start_date)
         .filter(func.DATE(models.TimeEntry.end) <= end_date)
-        .filter(extract("year", models.TimeEntry.start) == season)
+        .filter(utils.in_season(models.TimeEntry.start, season))
         .filter(models.TimeEntry.duration >= 600)
         # .filter(or_(models.TimeEntry.duration >= 600, models.TimeEntry.duration == None))
         .distinct()
@@ -236,10 +283,101 @@ def get_played_days(
     return played_days, real_played_days
 
 
-async def sync_clockify_entries_db(
-    db: Session, user: models.User, entries, only_time_entries: bool, silent: bool
-):
-    # current_season = datetime.datetime.now().year
+ENTRIES_CHUNK_SIZE = 500
+
+
+def parse_clockify_entry(db: Session, user: models.User, entry) -> tuple:
+    """
+    Convert a Clockify time entry into a TimeEntry row (plus the platform and
+    completed tags, which are not stored on the entry itself)
+    """
+    start = entry["timeInterval"]["start"]
+    end = entry["timeInterval"]["end"]
+    duration = entry["timeInterval"]["duration"]
+    tag_ids = entry.get("tagIds")
+    if tag_ids is None:
+        # Webhook payloads include the tags instead of their IDs
+        tag_ids = [tag["id"] for tag in entry.get("tags") or []]
+    platform, completed = clockify.classify_tags(db, tag_ids)
+
+    start = utils.change_timezone_clockify(start)
+    if end is not None and end != "":
+        end = utils.change_timezone_clockify(end)
+        duration = utils.convert_clockify_duration(duration)
+    else:
+        end = None
+        duration = None
+    row = {
+        "id": entry["id"],
+        "user_id": user.id,
+        "user_clockify_id": user.clockify_id,
+        "project_clockify_id": entry["projectId"],
+        "start": start,
+        "end": end,
+        "duration": duration,
+    }
+    return row, platform, completed
+
+
+def get_existing_time_entries(db: Session, entry_ids: list[str]) -> dict:
+    """
+    Get the stored version of the given time entries, keyed by ID
+    """
+    existing = {}
+    for i in range(0, len(entry_ids), ENTRIES_CHUNK_SIZE):
+        chunk = entry_ids[i : i + ENTRIES_CHUNK_SIZE]
+        stmt = select(
+            models.TimeEntry.id,
+            models.TimeEntry.project_clockify_id,
+            models.TimeEntry.start,
+            models.TimeEntry.end,
+            models.TimeEntry.duration,
+        ).where(models.TimeEntry.id.in_(chunk))
+        for row in db.execute(stmt):
+            existing[row.id] = row
+    return existing
+
+
+def time_entry_changed(row: dict, existing) -> bool:
+    if existing is None:
+        return True
+    if row["project_clockify_id"] != existing.project_clockify_id:
+        return True
+    if row["start"] != str(existing.start):
+        return True
+    # Running timers don't overwrite the stored end/duration
+    if row["end"] is not None:
+        if row["end"] != str(existing.end) or row["duration"] != existing.duration:
+            return True
+    return False
+
+
+def upsert_time_entries(db: Session, rows: list[dict]):
+    """
+    Write time entries with one multi-row INSERT ... ON DUPLICATE KEY UPDATE per
+    chunk. The caller is responsible for the commit.
+    """
+    for i in range(0, len(rows), ENTRIES_CHUNK_SIZE):
+        chunk = rows[i : i + ENTRIES_CHUNK_SIZE]
+        stmt = mysql_insert(models.TimeEntry).values(chunk)
+        stmt = stmt.on_duplicate_key_update(
+            project_clockify_id=stmt.inserted.project_clockify_id,
+            start=stmt.inserted.start,
+            end=func.coalesce(stmt.inserted.end, models.TimeEntry.end),
+            duration=func.coalesce(stmt.inserted.duration, models.TimeEntry.duration),
+        )
+        db.execute(stmt)
+
+
+def write_clockify_entries(
+    db: Session, user: models.User, entries, change_set: ChangeSet = None
+) -> list:
+    """
+    Write the new or changed Clockify entries of the user (in a single
+    transaction), adding them to change_set (if set). Returns the parsed
+    entries as (entry, row, platform, completed)
+    """
+    parsed_entries = []
     for entry in entries:
         if entry["projectId"] is None:
             logger.warning("Time entry without project: " + str(entry["id"]))
@@ -251,116 +389,94 @@ async def sync_clockify_entries_db(
             # await utils.send_message_to_user(user.telegram_id, msg)
             continue
         try:
-            # Extract data from time entry
-            start = entry["timeInterval"]["start"]
-            end = entry["timeInterval"]["end"]
-            duration = entry["timeInterval"]["duration"]
-            platform = None
-            completed = None
-            if entry["tagIds"] is not None and len(entry["tagIds"]) > 0:
-                for tag in entry["tagIds"]:
-                    platform_check = clockify.get_platform_by_tag_id(db, tag)
-                    completed_check = clockify.check_completed_tag_by_id(db, tag)
-                    if completed is None and completed_check is not None:
-                        completed = 1
-                    if platform is None and platform_check is not None:
-                        platform = tag
-
-            start = utils.change_timezone_clockify(start)
-            if end is not None and end != "":
-                end = utils.change_timezone_clockify(end)
-            else:
-                end = None
-
-            # Check if time entry already exists (to update it if needed)
-            stmt = select(models.TimeEntry).where(models.TimeEntry.id == entry["id"])
-            exists = db.execute(stmt).first()
-            # Create new time entry
-            if not exists:
-                try:
-                    if end is not None:
-                        new_entry = models.TimeEntry(
-                            id=entry["id"],
-                            user_id=user.id,
-                            user_clockify_id=user.clockify_id,
-                            project_clockify_id=entry["projectId"],
-                            start=start,
-                            end=end,
-                            duration=utils.convert_clockify_duration(duration),
-                        )
-                    else:
-                        new_entry = models.TimeEntry(
-                            id=entry["id"],
-                            user_id=user.id,
-                            user_clockify_id=user.clockify_id,
-                            project_clockify_id=entry["projectId"],
-                            start=start,
-                        )
-                    db.add(new_entry)
-                    db.commit()
-                except Exception as e:
-                    db.rollback()
-                    logger.error(
-                        "Error creating time entry " + str(entry) + ": " + str(e)
-                    )
-            # Update existing time entry
-            else:
-                try:
-                    if end is not None:
-                        stmt = (
-                            update(models.TimeEntry)
-                            .where(models.TimeEntry.id == entry["id"])
-                            .values(
-                                project_clockify_id=entry["projectId"],
-                                start=start,
-                                end=end,
-                                duration=utils.convert_clockify_duration(duration),
-                            )
-                        )
-                    else:
-                        stmt = (
-                            update(models.TimeEntry)
-                            .where(models.TimeEntry.id == entry["id"])
-                            .values(
-                                project_clockify_id=entry["projectId"],
-                                start=start,
-                            )
-                        )
-                    db.execute(stmt)
-                    db.commit()
-                except Exception as e:
-                    db.rollback()
-                    logger.error(
-                        "Error updating time entry " + str(entry) + ": " + str(e)
+            parsed_entries.append((entry, *parse_clockify_entry(db, user, entry)))
+        except Exception as e:
+            logger.error("Error parsing time entry " + str(entry) + ": " + str(e))
+
+    # Write only new or changed entries, in a single transaction
+    existing = get_existing_time_entries(db, [elem[1]["id"] for elem in parsed_entries])
+    changed_rows = [
+        row
+        for _, row, _, _ in parsed_entries
+        if time_entry_changed(row, existing.get(row["id"]))
+    ]
+    try:
+        upsert_time_entries(db, changed_rows)
+        # Flag the earliest changed day, so statistics depending on older days
+        # (like streaks) are recomputed instead of advanced
+        changed_days = []
+        for row in changed_rows:
+            day = datetime.datetime.strptime(row["start"], "%Y-%m-%d %H:%M:%S").date()
+            changed_days.append(day)
+            if change_set is not None:
+                change_set.add(user.id, row["project_clockify_id"], day)
+            old_entry = existing.get(row["id"])
+            if old_entry is not None:
+                changed_days.append(old_entry.start.date())
+                if change_set is not None:
+                    change_set.add(
+                        user.id, old_entry.project_clockify_id, old_entry.start.date()
                     )
+        if len(changed_days) > 0:
+            users.set_recompute_from(db, user.id, min(changed_days))
+            refresh_daily_rollup(db, user.id, changed_days)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error("Error writing time entries: " + str(e))
+        raise e
+    return parsed_entries
 
-            if only_time_entries:
-                continue
+
+async def sync_clockify_entries_db(
+    db: Session,
+    user: models.User,
+    entries,
+    only_time_entries: bool,
+    silent: bool,
+    change_set: ChangeSet = None,
+    platform_starts: dict = None,
+):
+    """
+    Write the Clockify entries of a user and update the games of the user.
+    If the entries of a sync come in batches, platform_starts (game id -> start
+    of the entry that set the platform) must be kept across them
+    """
+    current_season = datetime.datetime.now().year
+    parsed_entries = write_clockify_entries(db, user, entries, change_set)
+    if only_time_entries:
+        return
+    # Group the entries by game (ordered by start, pages are not), so each
+    # game and user game is resolved and updated once
+    entries_by_project = {}
+    for parsed_entry in sorted(parsed_entries, key=lambda item: item[1]["start"]):
+        entries_by_project.setdefault(parsed_entry[0]["projectId"], []).append(
+            parsed_entry
+        )
+    game_ids = set()
+    for project_id, project_entries in entries_by_project.items():
+        game_name = project_id
+        try:
+            first_entry, first_row, first_platform, _ = project_entries[0]
             # Check if game on clockify already exists on local DB
-            game = games.get_game_by_id(db, entry["projectId"])
+            game = games.get_game_by_id(db, project_id)
             if game is not None:
                 game_name = game.name
                 game_id = game.id
             else:
-                logger.info("Project " + entry["projectId"] + " not in DB")
-                project = clockify_api.get_project_by_id(entry["projectId"])
+                logger.info("Project " + project_id + " not in DB")
+                # Webhook entries include their project
+                project = first_entry.get("project")
+                if project is None:
+                    project = clockify_api.get_project_by_id(project_id)
                 # logger.debug("Clockify project:")
                 # logger.debug(project)
                 game_name = project["name"]
-                new_game_info = await utils.get_new_game_info(project)
-                # logger.debug("New game info:")
-                # logger.debug(new_game_info.__dict__)
-                new_game = await games.new_game(db, new_game_info)
-                game_id = new_game.id
-
-            # Add game to GameStatistics (if needed)
-            try:
-                games.create_game_statistics(db, game_id)
-                games.create_game_statistics_historical(db, game_id)
-            except Exception as e:
-                logger.error(
-                    "Error creating game statistics for " + game_name + ": " + str(e)
-                )
+                # Added right away, RAWG/HLTB info is added later by the worker
+                game = games.add_placeholder_game(db, project_id, game_name)
+                game_id = game.id
+
+            game_ids.add(game_id)
 
             # Check if player already plays the game this season
             # if time_entry_year == config.CURRENT_SEASON:
@@ -369,13 +485,13 @@ async def sync_clockify_entries_db(
                 try:
                     logger.info("User not playing " + game_name)
                     new_user_game = schemas.NewGameUser(
-                        game_id=game_id, platform=platform
+                        game_id=game_id, platform=first_platform
                     )
                     await users.add_new_game(
                         db,
                         game=new_user_game,
                         user=user,
-                        start_date=start,
+                        start_date=first_row["start"],
                         silent=silent,
                         from_sync=True,
                     )
@@ -384,26 +500,65 @@ async def sync_clockify_entries_db(
                     )
                 except Exception as e:
                     logger.error("Error adding game " + game_name + ": " + str(e))
-            try:
-                if platform is not None and already_playing.platform != platform:
+            else:
+                # Entries come in batches, so an older one may be on a later batch
+                first_date = datetime.datetime.strptime(
+                    first_row["start"], "%Y-%m-%d %H:%M:%S"
+                ).date()
+                started_date = already_playing.started_date
+                if (
+                    started_date is not None
+                    and first_date < started_date
+                    and first_date.year == started_date.year
+                ):
                     try:
                         stmt = (
                             update(models.UserGame)
                             .where(models.UserGame.id == already_playing.id)
-                            .values(
-                                platform=platform,
-                            )
+                            .values(started_date=first_date)
                         )
-                        db.execute(stmt)
-                        db.commit()
+                        with db.begin_nested():
+                            db.execute(stmt)
                     except Exception as e:
-                        db.rollback()
                         logger.error(
-                            "Error updating platform for " + game_name + ": " + str(e)
+                            "Error updating start date for "
+                            + game_name
+                            + ": "
+                            + str(e)
                         )
-            except Exception as e:
-                logger.error("Error updating platform for " + game_name + ": " + str(e))
-            if completed is not None and already_playing.completed != 1:
+            # The platform of the last tagged entry is the current one. Pages
+            # come newest first, so an older batch does not change it
+            platforms = [
+                (row["start"], platform)
+                for _, row, platform, _ in project_entries
+                if platform is not None
+            ]
+            if len(platforms) > 0 and platform_starts is not None:
+                if platform_starts.get(game_id, "") > platforms[-1][0]:
+                    platforms = []
+                else:
+                    platform_starts[game_id] = platforms[-1][0]
+            if len(platforms) > 0 and already_playing.platform != platforms[-1][1]:
+                try:
+                    stmt = (
+                        update(models.UserGame)
+                        .where(models.UserGame.id == already_playing.id)
+                        .values(
+                            platform=platforms[-1][1],
+                        )
+                    )
+                    with db.begin_nested():
+                        db.execute(stmt)
+                except Exception as e:
+                    logger.error(
+                        "Error updating platform for " + game_name + ": " + str(e)
+                    )
+            completed_starts = [
+                row["start"]
+                for _, row, _, completed in project_entries
+                if completed is not None
+            ]
+            if len(completed_starts) > 0 and already_playing.completed != 1:
                 try:
                     logger.info("Completing game " + str(game.id) + "...")
                     played_time = get_user_games_played_time(db, user.id, game.id)
@@ -416,22 +571,46 @@ async def sync_clockify_entries_db(
                         db,
                         user.id,
                         game.id,
-                        completed_date=start,
+                        completed_date=completed_starts[0],
                         silent=silent,
                         from_sync=True,
                     )
                 except Exception as e:
                     logger.error("Error completing game " + game_name + ": " + str(e))
-            try:
-                update_game = models.UserGame(platform=platform)
-                users.update_game(db, update_game, already_playing.id)
-            except Exception as e:
-                logger.error("Error updating game" + game_name + " for user: " + str(e))
-
-            db.commit()
+            elif len(completed_starts) > 0 and already_playing.completed_date:
+                # Completed on a newer batch, but the first completed entry
+                # sets the date
+                completed_date = datetime.datetime.strptime(
+                    completed_starts[0], "%Y-%m-%d %H:%M:%S"
+                ).date()
+                if completed_date < already_playing.completed_date:
+                    try:
+                        stmt = (
+                            update(models.UserGame)
+                            .where(models.UserGame.id == already_playing.id)
+                            .values(completed_date=completed_date)
+                        )
+                        with db.begin_nested():
+                            db.execute(stmt)
+                    except Exception as e:
+                        logger.error(
+                            "Error updating completed date for "
+                            + game_name
+                            + ": "
+                            + str(e)
+                        )
         except Exception as e:
-            db.rollback()
-            logger.error("Error adding time entry " + str(entry) + ": " + str(e))
+            # Its writes were on savepoints, so the other games are kept
+            logger.error("Error adding time entries of " + game_name + ": " + str(e))
+    # Games of all the entries are updated in a single transaction
+    try:
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error("Error updating games of time entries: " + str(e))
+        raise e
+    # Add games to GameStatistics (if needed)
+    statistics_rows.ensure_games(db, list(game_ids))
 
 
 def get_time_entry_by_time(
@@ -439,7 +618,7 @@ def get_time_entry_by_time(
     user_id: int,
     duration: int,
     mode: int,
-    season: int = current_season,
+    season: int = None,
 ) -> models.TimeEntry:
     """_summary_
 
@@ -452,13 +631,15 @@ def get_time_entry_by_time(
     Returns:
         _type_: _description_
     """
+    if season is None:
+        season = datetime.datetime.now().year
     if mode == 1:
         time_entry = (
             db.query(models.TimeEntry)
             .filter(
                 models.TimeEntry.user_id == user_id,
                 models.TimeEntry.duration == duration,
-                extract("year", models.TimeEntry.start) == season,
+                utils.in_season(models.TimeEntry.start, season),
             )
             .first()
         )
@@ -468,7 +649,7 @@ def get_time_entry_by_time(
             .filter(
                 models.TimeEntry.user_id == user_id,
                 models.TimeEntry.duration <= duration,
-                extract("year", models.TimeEntry.start) == season,
+                utils.in_season(models.TimeEntry.start, season),
             )
             .first()
         )
@@ -478,21 +659,23 @@ def get_time_entry_by_time(
             .filter(
                 models.TimeEntry.user_id == user_id,
                 models.TimeEntry.duration >= duration,
-                extract("year", models.TimeEntry.start) == season,
+                utils.in_season(models.TimeEntry.start, season),
             )
             .first()
         )
     return time_entry
 
 
-def get_played_time_by_day(db: Session, user_id: int, season: int = current_season):
+def get_played_time_by_day(db: Session, user_id: int, season: int = None):
+    if season is None:
+        season = datetime.datetime.now().year
     played_start_days = (
-        db.query(func.DATE(models.TimeEntry.start), func.sum(models.TimeEntry.duration))
+        db.query(models.TimeEntryDaily.day, func.sum(models.TimeEntryDaily.seconds))
         .filter(
-            models.TimeEntry.user_id == user_id,
-            extract("year", models.TimeEntry.start) == season,
+            models.TimeEntryDaily.user_id == user_id,
+            utils.in_season(models.TimeEntryDaily.day, season),
         )
-        .group_by(func.DATE(models.TimeEntry.start))
+        .group_by(models.TimeEntryDaily.day)
         .all()
     )
     return sorted(played_start_days)
@@ -503,7 +686,7 @@ def get_time_entry_between_hours(
     user_id: int,
     start_hour: int,
     end_hour: int,
-    season: int = current_season,
+    season: int = None,
 ) -> list[models.TimeEntry]:
     """_summary_
 
@@ -516,12 +699,14 @@ def get_time_entry_between_hours(
     Returns:
         list[models.TimeEntry]: _description_
     """
+    if season is None:
+        season = datetime.datetime.now().year
     time_entries = (
         db.query(models.TimeEntry)
         .filter(models.TimeEntry.user_id == user_id)
         .filter(extract("hour", models.TimeEntry.start) >= start_hour)
         .filter(extract("hour", models.TimeEntry.start) < end_hour)
-        .filter(extract("year", models.TimeEntry.start) == season)
+        .filter(utils.in_season(models.TimeEntry.start, season))
         .all()
     )
     return time_entries
@@ -613,14 +798,13 @@ def get_weekly_resume(
     first_day, last_day = utils.get_week_range_dates(weeks_ago)
     weekly_hours = (
         db.query(
-            func.sum(models.TimeEntry.duration),
-            func.count(models.TimeEntry.id),
-            func.count(func.distinct(models.TimeEntry.project_clockify_id)),
+            func.sum(models.TimeEntryDaily.seconds),
+            func.coalesce(func.sum(models.TimeEntryDaily.sessions), 0),
+            func.count(func.distinct(models.TimeEntryDaily.game_id)),
         )
-        .filter(models.TimeEntry.user_id == user.id)
-        .filter(func.DATE(models.TimeEntry.start) >= first_day)
-        .filter(func.DATE(models.TimeEntry.start) <= last_day)
-        .filter(models.TimeEntry.duration > 0)
+        .filter(models.TimeEntryDaily.user_id == user.id)
+        .filter(models.TimeEntryDaily.day >= first_day)
+        .filter(models.TimeEntryDaily.day <= last_day)
         .all()
     )
     return weekly_hours
@@ -628,7 +812,127 @@ def get_weekly_resume(
 
 def delete_time_entry(db: Session, time_entry_id: str):
     try:
-        db.query(models.TimeEntry).filter(models.TimeEntry.id == time_entry_id).delete()
+        time_entry = (
+            db.query(models.TimeEntry)
+            .filter(models.TimeEntry.id == time_entry_id)
+            .first()
+        )
+        if time_entry is None:
+            return
+        db.delete(time_entry)
+        if time_entry.duration is not None and time_entry.duration > 0:
+            db.flush()
+            users.set_recompute_from(db, time_entry.user_id, time_entry.start.date())
+            refresh_daily_rollup(db, time_entry.user_id, [time_entry.start.date()])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error("Error deleting time entry " + str(time_entry_id) + ": " + str(e))
+        raise e
+
+
+def daily_rollup_select():
+    """Select the daily rollup rows from the time entries"""
+    day = func.DATE(models.TimeEntry.start)
+    return select(
+        models.TimeEntry.user_id,
+        day,
+        models.TimeEntry.project_clockify_id,
+        func.sum(models.TimeEntry.duration),
+        func.count(models.TimeEntry.id),
+        func.max(models.TimeEntry.duration),
+    ).where(
+        models.TimeEntry.duration > 0,
+        models.TimeEntry.project_clockify_id.isnot(None),
+    )
+
+
+def insert_daily_rollup(db: Session, stmt):
+    day = func.DATE(models.TimeEntry.start)
+    stmt = stmt.group_by(
+        models.TimeEntry.user_id, day, models.TimeEntry.project_clockify_id
+    )
+    db.execute(
+        insert(models.TimeEntryDaily).from_select(
+            ["user_id", "day", "game_id", "seconds", "sessions", "longest_session"],
+            stmt,
+        )
+    )
+
+
+def refresh_daily_rollup(db: Session, user_id: int, days: list[datetime.date]):
+    """
+    Recompute the daily rollup rows of the user for the given days.
+    The caller must commit
+    """
+    days = sorted(set(days))
+    if len(days) == 0:
+        return
+    db.query(models.TimeEntryDaily).filter(
+        models.TimeEntryDaily.user_id == user_id,
+        models.TimeEntryDaily.day.in_(days),
+    ).delete(synchronize_session=False)
+    stmt = daily_rollup_select().where(
+        models.TimeEntry.user_id == user_id,
+        models.TimeEntry.start >= days[0],
+        models.TimeEntry.start < days[-1] + datetime.timedelta(days=1),
+        func.DATE(models.TimeEntry.start).in_(days),
+    )
+    insert_daily_rollup(db, stmt)
+
+
+def rebuild_daily_rollup(db: Session, force: bool = False):
+    """Rebuild the whole daily rollup (only if it's empty unless force)"""
+    if not force and db.query(models.TimeEntryDaily.user_id).first() is not None:
+        return
+    try:
+        logger.info("Rebuilding daily rollup...")
+        db.query(models.TimeEntryDaily).delete(synchronize_session=False)
+        insert_daily_rollup(db, daily_rollup_select())
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error("Error rebuilding daily rollup: " + str(e))
+        raise e
+
+
+def get_sync_state(db: Session, user_id: int) -> models.UserSyncState:
+    return (
+        db.query(models.UserSyncState)
+        .filter(models.UserSyncState.user_id == user_id)
+        .first()
+    )
+
+
+def needs_full_reconciliation(sync_state: models.UserSyncState) -> bool:
+    """
+    Check if the user must be synced with the whole SYNC_DAYS window instead of
+    only the entries after the watermark.
+    """
+    if sync_state is None or sync_state.watermark is None:
+        return True
+    if sync_state.last_full_sync is None:
+        return True
+    next_full_sync = sync_state.last_full_sync + datetime.timedelta(
+        minutes=config.SYNC_FULL_RECONCILIATION_MINUTES
+    )
+    return datetime.datetime.utcnow() >= next_full_sync
+
+
+def update_sync_state(
+    db: Session, user_id: int, watermark: datetime.datetime, full_sync: bool
+):
+    try:
+        now = datetime.datetime.utcnow()
+        sync_state = get_sync_state(db, user_id)
+        if sync_state is None:
+            sync_state = models.UserSyncState(user_id=user_id)
+            db.add(sync_state)
+        sync_state.watermark = watermark
+        sync_state.last_sync = now
+        if full_sync:
+            sync_state.last_full_sync = now
         db.commit()
     except Exception as e:
-        logger.error(e)
+        db.rollback()
+        logger.error("Error updating sync state: " + str(e))
@@ -5,15 +5,17 @@ import random
 
 import bcrypt
 from sqlalchemy import (
+    and_,
     asc,
+    case,
     create_engine,
     desc,
     func,
     or_,
     select,
     text,
+    tuple_,
     update,
-    extract,
 )
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
@@ -33,7 +35,6 @@ logger = log_manager.get_logger()
 
 clockify_api = ClockifyApi()
 config = Config()
-current_season = datetime.datetime.now().year
 
 #################
 ##### USERS #####
@@ -381,10 +382,12 @@ async def add_new_game(
     game: schemas.NewGameUser,
     user: models.User,
     start_date: str = None,
-    season: int = current_season,
+    season: int = None,
     silent: bool = False,
     from_sync=False,
 ) -> models.UserGame:
+    if season is None:
+        season = datetime.datetime.now().year
     logger.info("Adding new user game...")
     try:
         if start_date is None:
@@ -416,9 +419,13 @@ async def add_new_game(
             clockify_api.create_empty_time_entry(
                 db, user.clockify_key, game_db.id, game.platform
             )
-        started_game = (
-            "[" + game_db.name + "](https://rawg.io/games/" + game_db.slug + ")"
-        )
+        if game_db.slug is not None:
+            started_game = (
+                "[" + game_db.name + "](https://rawg.io/games/" + game_db.slug + ")"
+            )
+        else:
+            # Not found on RAWG (yet)
+            started_game = game_db.name
         msg = (
             "*"
             + user.name
@@ -443,26 +450,24 @@ async def add_new_game(
 
 
 def update_game(db: Session, game: models.UserGame, entry_id):
-    current_year = datetime.datetime.now().year
-    if current_year == current_season:
-        try:
-            stmt = (
-                update(models.UserGame)
-                .where(
-                    models.UserGame.id == entry_id,
-                    or_(
-                        models.UserGame.platform == game.platform,
-                    ),
-                )
-                .values(platform=game.platform)
+    try:
+        stmt = (
+            update(models.UserGame)
+            .where(
+                models.UserGame.id == entry_id,
+                or_(
+                    models.UserGame.platform == game.platform,
+                ),
             )
-            db.execute(stmt)
-            db.commit()
-        except SQLAlchemyError as e:
-            db.rollback()
-            if "Duplicate" not in str(e):
-                logger.error("Error updating game: " + str(e))
-                raise e
+            .values(platform=game.platform)
+        )
+        db.execute(stmt)
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        if "Duplicate" not in str(e):
+            logger.error("Error updating game: " + str(e))
+            raise e
 
 
 def update_played_time_game(
@@ -470,15 +475,17 @@ def update_played_time_game(
     user_id: str,
     game_id: str,
     time: int,
-    season: int = current_season,
+    season: int = None,
 ):
+    if season is None:
+        season = datetime.datetime.now().year
     try:
         stmt = (
             update(models.UserGame)
             .where(
                 models.UserGame.game_id == game_id,
                 models.UserGame.user_id == user_id,
-                extract("year", models.UserGame.started_date) == season,
+                utils.in_season(models.UserGame.started_date, season),
             )
             .values(played_time=time)
             .execution_options(synchronize_session="fetch")
@@ -492,8 +499,69 @@ def update_played_time_game(
         raise
 
 
-def count_played_games(db: Session, user_id: int, season: int = current_season):
+def update_played_time_games(
+    db: Session,
+    played_times: list[tuple],
+    season: int = None,
+    commit: bool = True,
+):
+    """
+    Set the played time of many games (user_id, game_id, time) with one
+    UPDATE per chunk and a single commit (by the caller if commit is False)
+    """
+    if season is None:
+        season = datetime.datetime.now().year
+    chunk_size = 500
+    try:
+        for i in range(0, len(played_times), chunk_size):
+            chunk = played_times[i : i + chunk_size]
+            played_time = case(
+                *[
+                    (
+                        and_(
+                            models.UserGame.user_id == user_id,
+                            models.UserGame.game_id == game_id,
+                        ),
+                        time,
+                    )
+                    for user_id, game_id, time in chunk
+                ],
+                else_=models.UserGame.played_time,
+            )
+            stmt = (
+                update(models.UserGame)
+                .where(
+                    tuple_(models.UserGame.user_id, models.UserGame.game_id).in_(
+                        [(user_id, game_id) for user_id, game_id, _ in chunk]
+                    ),
+                    utils.in_season(models.UserGame.started_date, season),
+                )
+                .values(played_time=played_time)
+                .execution_options(synchronize_session=False)
+            )
+            db.execute(stmt)
+        if commit:
+            db.commit()
+    except SQLAlchemyError as e:
+        if commit:
+            db.rollback()
+        logger.error("Error updating played time games: " + str(e))
+        raise
+
+
+def count_played_games(
+    db: Session, user_id: int, season: int = None, distinct: bool = False
+):
+    """Count the user games of the season (each game once if distinct)"""
+    if season is None:
+        season = datetime.datetime.now().year
     try:
+        if distinct:
+            return (
+                db.query(func.count(func.distinct(models.UserGame.game_id)))
+                .filter_by(user_id=user_id, season=season)
+                .scalar()
+            )
         return (
             db.query(models.UserGame).filter_by(user_id=user_id, season=season).count()
         )
@@ -507,8 +575,10 @@ def get_games(
     user_id,
     limit=None,
     completed=None,
-    season: int = current_season,
+    season: int = None,
 ) -> list[schemas.UserGame]:
+    if season is None:
+        season = datetime.datetime.now().year
     if completed != None:
         completed = 1 if completed == True else 0
         stmt = (
@@ -530,7 +600,7 @@ def get_games(
             .where(
                 models.UserGame.user_id == user_id,
                 models.UserGame.completed == completed,
-                extract("year", models.UserGame.started_date) == season,
+                utils.in_season(models.UserGame.started_date, season),
                 models.UserGame.user_id == user_id,
                 models.TimeEntry.user_id == user_id,
             )
@@ -574,7 +644,7 @@ def get_games(
             )
             .where(
                 models.UserGame.user_id == user_id,
-                extract("year", models.UserGame.started_date) == season,
+                utils.in_season(models.UserGame.started_date, season),
                 models.UserGame.user_id == user_id,
                 models.TimeEntry.user_id == user_id,
             )
@@ -600,6 +670,16 @@ def get_games(
         return unique_data
 
 
+def get_season_game_ids(db: Session, user_id: int, season: int = None) -> list[str]:
+    """Get the IDs of the games played by the user on the season"""
+    if season is None:
+        season = datetime.datetime.now().year
+    stmt = select(models.UserGame.game_id).where(
+        models.UserGame.user_id == user_id, models.UserGame.season == season
+    )
+    return [row[0] for row in db.execute(stmt)]
+
+
 def get_game_by_id(db: Session, user_id, game_id, season) -> models.UserGame:
     return (
         db.query(models.UserGame)
@@ -638,7 +718,7 @@ def update_played_days(
             raise e
 
 
-def update_played_time(db: Session, user_id, played_time):
+def update_played_time(db: Session, user_id, played_time, commit: bool = True):
     # current_year = datetime.datetime.now().year
     try:
         # if current_year == current_season:
@@ -648,7 +728,8 @@ def update_played_time(db: Session, user_id, played_time):
             .values(played_time=played_time)
         )
         db.execute(stmt)
-        db.commit()
+        if commit:
+            db.commit()
         # stmt = (
         #     update(models.UserStatisticsHistorical)
         #     .where(models.UserStatisticsHistorical.user_id == user_id)
@@ -661,12 +742,14 @@ def update_played_time(db: Session, user_id, played_time):
         raise e
 
 
-def game_is_completed(db: Session, player, game, season: int = current_season) -> bool:
+def game_is_completed(db: Session, player, game, season: int = None) -> bool:
+    if season is None:
+        season = datetime.datetime.now().year
     stmt = select(models.UserGame).where(
         models.UserGame.game == game,
         models.UserGame.player == player,
         models.UserGame.completed == 1,
-        extract("year", models.UserGame.started_date) == season,
+        utils.in_season(models.UserGame.started_date, season),
     )
     game = db.execute(stmt).first()
     if game:
@@ -679,16 +762,18 @@ async def complete_game(
     user_id,
     game_id,
     completed_date: str = None,
-    season: int = current_season,
+    season: int = None,
     silent: bool = False,
     from_sync=False,
 ):
+    if season is None:
+        season = datetime.datetime.now().year
     current_year = datetime.datetime.now().year
     try:
         db_game = games.get_game_by_id(db, game_id)
         user = get_user_by_id(db, user_id)
         user_game = get_game_by_id(db, user_id, db_game.id, current_year)
-        game_info = await utils.get_game_info(db_game.name)
+        game_info = await utils.get_game_info(db_game.name, db)
         if not from_sync:
             clockify_api.create_empty_time_entry(
                 db,
@@ -707,7 +792,7 @@ async def complete_game(
             .where(
                 models.UserGame.game_id == game_id,
                 models.UserGame.user_id == user_id,
-                extract("year", models.UserGame.started_date) == season,
+                utils.in_season(models.UserGame.started_date, season),
             )
             .values(
                 completed=1,
@@ -770,15 +855,17 @@ async def rate_game(
     user_id,
     game_id,
     score,
-    season: int = current_season,
+    season: int = None,
 ) -> models.UserGame:
+    if season is None:
+        season = datetime.datetime.now().year
     try:
         stmt = (
             update(models.UserGame)
             .where(
                 models.UserGame.game_id == game_id,
                 models.UserGame.user_id == user_id,
-                extract("year", models.UserGame.started_date) == season,
+                utils.in_season(models.UserGame.started_date, season),
             )
             .values(
                 score=score,
@@ -807,6 +894,40 @@ def get_streaks(db: Session, username: str):
         raise e
 
 
+def get_user_statistics(db: Session, user_id: int) -> models.UserStatistics:
+    return db.query(models.UserStatistics).filter_by(user_id=user_id).first()
+
+
+def get_users_sync_statistics(db: Session, user_ids: list[int]) -> dict:
+    """
+    recompute_from and statistics_date of the users (by user id), with a
+    single query. Used to skip the users without changes
+    """
+    rows = db.query(
+        models.UserStatistics.user_id,
+        models.UserStatistics.recompute_from,
+        models.UserStatistics.statistics_date,
+    ).filter(models.UserStatistics.user_id.in_(user_ids))
+    return {row.user_id: row for row in rows}
+
+
+def set_recompute_from(db: Session, user_id: int, day: datetime.date):
+    """
+    Flag that entries from day onwards changed. Keeps the earliest flagged day.
+    The caller must commit
+    """
+    stmt = (
+        update(models.UserStatistics)
+        .where(models.UserStatistics.user_id == user_id)
+        .values(
+            recompute_from=func.least(
+                func.coalesce(models.UserStatistics.recompute_from, day), day
+            )
+        )
+    )
+    db.execute(stmt)
+
+
 def update_streaks(
     db: Session,
     user_id,
@@ -816,24 +937,38 @@ def update_streaks(
     best_unplayed_streak,
     best_unplayed_streak_date,
     current_unplayed_streak,
+    streak_state: dict = None,
+    commit: bool = True,
 ):
     try:
+        values = dict(
+            current_streak=current_streak,
+            best_streak=best_streak,
+            best_streak_date=best_streak_date,
+            best_unplayed_streak=best_unplayed_streak,
+            best_unplayed_streak_date=best_unplayed_streak_date,
+            current_unplayed_streak=current_unplayed_streak,
+        )
+        if streak_state is not None:
+            values.update(
+                played_days=streak_state["played_days"],
+                last_played_date=streak_state["last_played_date"],
+                last_played_streak=streak_state["last_played_streak"],
+                last_unplayed_streak=streak_state["last_unplayed_streak"],
+                recompute_from=None,
+                statistics_date=datetime.date.today(),
+            )
         stmt = (
             update(models.UserStatistics)
             .where(models.UserStatistics.user_id == user_id)
-            .values(
-                current_streak=current_streak,
-                best_streak=best_streak,
-                best_streak_date=best_streak_date,
-                best_unplayed_streak=best_unplayed_streak,
-                best_unplayed_streak_date=best_unplayed_streak_date,
-                current_unplayed_streak=current_unplayed_streak,
-            )
+            .values(**values)
         )
         db.execute(stmt)
-        db.commit()
+        if commit:
+            db.commit()
     except Exception as e:
-        db.rollback()
+        if commit:
+            db.rollback()
         logger.error("Error updating streaks: " + str(e))
         raise e
 
@@ -902,6 +1037,34 @@ def update_current_ranking_hours(db: Session, ranking, user_id):
     db.commit()
 
 
+def update_current_rankings_hours(
+    db: Session, rankings: list[tuple], commit: bool = True
+):
+    """Set the current ranking of many users (user_id, ranking) in one UPDATE"""
+    if len(rankings) == 0:
+        return
+    try:
+        rankings = dict(rankings)
+        stmt = (
+            update(models.UserStatistics)
+            .where(models.UserStatistics.user_id.in_(list(rankings)))
+            .values(
+                current_ranking_hours=case(
+                    rankings, value=models.UserStatistics.user_id
+                )
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(stmt)
+        if commit:
+            db.commit()
+    except SQLAlchemyError as e:
+        if commit:
+            db.rollback()
+        logger.error("Error updating users current ranking: " + str(e))
+        raise
+
+
 def activate_account(db: Session, username: str):
     try:
         logger.info("Activating account...")
@@ -933,9 +1096,9 @@ def activate_account(db: Session, username: str):
 ######################
 
 
-def top_games(
-    db: Session, username: str, limit: int = 10, season: int = current_season
-):
+def top_games(db: Session, username: str, limit: int = 10, season: int = None):
+    if season is None:
+        season = datetime.datetime.now().year
     try:
         user = get_user_by_username(db, username)
         stmt = (
@@ -949,7 +1112,7 @@ def top_games(
             .join(models.Game, models.Game.id == models.UserGame.game_id)
             .where(
                 models.UserGame.user_id == user.id,
-                extract("year", models.UserGame.started_date) == season,
+                utils.in_season(models.UserGame.started_date, season),
             )
             .group_by(
                 models.UserGame.user_id,
@@ -1039,7 +1202,9 @@ def top_games(
 #         raise e
 
 
-def get_achievements(db: Session, username: str, season: int = current_season):
+def get_achievements(db: Session, username: str, season: int = None):
+    if season is None:
+        season = datetime.datetime.now().year
     try:
         user = get_user_by_username(db, username)
         stmt = (
@@ -0,0 +1,38 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from ..utils.logger import LogManager
+from .database import Base
+
+log_manager = LogManager()
+logger = log_manager.get_logger()
+
+
+def upgrade_schema(engine: Engine):
+    """
+    Add the columns and indexes declared on the models that are missing on
+    existing tables (create_all only creates missing tables)
+    """
+    inspector = inspect(engine)
+    existing_tables = inspector.get_table_names()
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            columns = [column["name"] for column in inspector.get_columns(table.name)]
+            for column in table.columns:
+                if column.name not in columns:
+                    logger.info("Adding column " + table.name + "." + column.name)
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(
+                        text(
+                            "ALTER TABLE `{}` ADD COLUMN `{}` {}".format(
+                                table.name, column.name, column_type
+                            )
+                        )
+                    )
+            indexes = [index["name"] for index in inspector.get_indexes(table.name)]
+            for index in table.indexes:
+                if index.name not in indexes:
+                    logger.info("Adding index " + index.name)
+                    index.create(bind=conn)
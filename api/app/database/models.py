@@ -7,6 +7,7 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     Interval,
     LargeBinary,
@@ -56,6 +57,14 @@ class UserStatistics(Base):
     best_unplayed_streak_date = Column(Date)
     played_games = Column(Integer)
     completed_games = Column(Integer)
+    # Streak state, advanced with the days played since the last sync
+    last_played_date = Column(Date)
+    last_played_streak = Column(Integer)
+    last_unplayed_streak = Column(Integer)
+    # Earliest day with changed entries since the last statistics update
+    recompute_from = Column(Date)
+    # Day of the last statistics update (current streaks change every day)
+    statistics_date = Column(Date)
 
     __table_args__ = (UniqueConstraint("user_id"),)
 
@@ -203,7 +212,11 @@ class TimeEntry(Base):
     duration = Column(Integer)
     tags = Column(String(255))
 
-    __table_args__ = (UniqueConstraint("id"),)
+    __table_args__ = (
+        UniqueConstraint("id"),
+        Index("ix_time_entries_user_start", "user_id", "start"),
+        Index("ix_time_entries_project_start", "project_clockify_id", "start"),
+    )
 
 
 class TimeEntryHistorical(Base):
@@ -220,6 +233,91 @@ class TimeEntryHistorical(Base):
     __table_args__ = (UniqueConstraint("id"),)
 
 
+class TimeEntryDaily(Base):
+    """Played time per user, game and day (from time entries with duration)"""
+
+    __tablename__ = "time_entries_daily"
+
+    user_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    game_id = Column(String(255), primary_key=True)
+    seconds = Column(Integer)
+    sessions = Column(Integer)
+    longest_session = Column(Integer)
+
+    __table_args__ = (Index("ix_time_entries_daily_game_day", "game_id", "day"),)
+
+
+class RankingSnapshot(Base):
+    """Rankings computed at the end of a sync. Each run with changes adds a version"""
+
+    __tablename__ = "ranking_snapshots"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    version = Column(Integer)
+    ranking_type = Column(String(255))
+    season = Column(Integer)
+    position = Column(Integer)
+    subject = Column(String(255))
+    value = Column(Float)
+    data = Column(JSON)
+    computed_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_ranking_snapshots_season_version", "season", "version"),
+        # Concurrent writers can not add rows to the same version
+        Index(
+            "ux_ranking_snapshots_position",
+            "season",
+            "version",
+            "ranking_type",
+            "position",
+            unique=True,
+        ),
+    )
+
+
+class GameEnrichment(Base):
+    """Games added from Clockify waiting for their RAWG/HLTB info (app.worker)"""
+
+    __tablename__ = "games_enrichment"
+
+    game_id = Column(String(255), primary_key=True)
+    # pending, done or failed
+    status = Column(String(255))
+    attempts = Column(Integer)
+    error = Column(String(255))
+    created_at = Column(DateTime)
+    # Not retried before
+    run_after = Column(DateTime)
+
+    __table_args__ = (Index("ix_games_enrichment_status", "status", "run_after"),)
+
+
+class RawgCache(Base):
+    """RAWG search results (first result, or null if none), by normalized query"""
+
+    __tablename__ = "rawg_cache"
+
+    query = Column(String(255), primary_key=True)
+    response = Column(JSON)
+    fetched_at = Column(DateTime)
+    # Least recently used entries are evicted first
+    last_used_at = Column(DateTime, index=True)
+
+
+class UserSyncState(Base):
+    __tablename__ = "users_sync_state"
+
+    user_id = Column(Integer, primary_key=True)
+    # Clockify (UTC) start of the oldest entry that may still change
+    watermark = Column(DateTime)
+    last_sync = Column(DateTime)
+    last_full_sync = Column(DateTime)
+
+    __table_args__ = (UniqueConstraint("user_id"),)
+
+
 class PlatformTag(Base):
     __tablename__ = "platform_tags"
 
@@ -253,7 +351,31 @@ class CoreNotification(Base):
 
 
 class RequestSync(Base):
+    """Sync jobs queue (drained by app.worker)"""
+
     __tablename__ = "request_sync"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     request_id = Column(String(255), primary_key=True)
+    # pending, running, done or failed
+    status = Column(String(255))
+    # actions.sync_data arguments
+    params = Column(JSON)
+    attempts = Column(Integer)
+    error = Column(String(255))
+    created_at = Column(DateTime)
+    # Not run before (coalesces the webhook events of a user)
+    run_after = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (Index("ix_request_sync_status", "status", "id"),)
+
+
+class WebhookEvent(Base):
+    """Received webhook events, to drop the ones delivered again"""
+
+    __tablename__ = "webhook_events"
+
+    event_id = Column(String(255), primary_key=True)
+    received_at = Column(DateTime, index=True)
@@ -10,6 +10,7 @@ from fastapi_versioning import VersionedFastAPI
 from .config import Config
 from .database import models
 from .database.database import SessionLocal, engine
+from .database.migrations import upgrade_schema
 from .routers import admin, basic, bot, games, statistics, users, utils, webhooks
 from .utils.logger import LogManager
 
@@ -65,6 +66,7 @@ uvicorn_logger = logging.getLogger("uvicorn.access")
 uvicorn_logger.addFilter(EndpointFilter(excluded_paths))
 
 models.Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
 app = FastAPI(title="LaViciacion API", version="0.1.0")
 
@@ -14,7 +14,7 @@ from sqlalchemy.orm import Session
 
 from .. import auth
 from ..config import Config
-from ..crud import users
+from ..crud import request_sync, users
 from ..crud.achievements import Achievements
 from ..database import models, schemas
 from ..database.database import SessionLocal, engine
@@ -94,7 +94,7 @@ def init(
     return "Init completed!"
 
 
-@router.get("/sync-data")
+@router.get("/sync-data", status_code=status.HTTP_202_ACCEPTED)
 @version(1)
 async def sync_data(
     api_key: None = Security(auth.get_api_key),
@@ -147,18 +147,21 @@ async def sync_data(
     try:
         # for admin in config.ADMIN_USERS:
         #     users.create_admin_user(db, admin)
-        await actions.sync_data(
+        # The sync runs on the worker (app.worker)
+        job = request_sync.enqueue_sync(
             db,
-            user_clfy_id=user_clfy_id,
-            sync_season=sync_season,
-            silent=silent,
-            sync_all=sync_all,
-            only_acive_users=only_acive_users,
-            only_time_entries=only_time_entries,
+            {
+                "user_clfy_id": user_clfy_id,
+                "sync_season": sync_season,
+                "silent": silent,
+                "sync_all": sync_all,
+                "only_acive_users": only_acive_users,
+                "only_time_entries": only_time_entries,
+            },
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    return {"message": "Sync completed!"}
+    return {"message": "Sync queued", "job_id": job.id}
 
 
 @router.put("/update_user", response_model=schemas.User)
@@ -1,7 +1,7 @@
 from enum import Enum
 from typing import Union
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi_versioning import version
 from sqlalchemy.orm import Session
 
@@ -276,6 +276,7 @@ class UserStatisticsTypes(str, Enum):
 @version(1)
 def get_ranking_statistics(
     ranking: str,
+    request: Request,
     db: Session = Depends(get_db),
 ):
     """_summary_
@@ -287,7 +288,7 @@ def get_ranking_statistics(
     Returns:
         _type_: _description_
     """
-    return statistics.get_ranking_statistics(ranking, db)
+    return statistics.get_ranking_statistics(ranking, db, request)
 
 
 @router.get("/statistics/users/{username}")
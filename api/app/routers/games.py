@@ -99,7 +99,7 @@ async def get_game_rawg_by_name(name: str, db: Session = Depends(get_db)):
     Returns:
         _type_: _description_
     """
-    game_info = await utils.get_game_info(name)
+    game_info = await utils.get_game_info(name, db)
     return game_info
 
 
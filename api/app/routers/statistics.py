@@ -1,19 +1,25 @@
+import hashlib
+import json
 from enum import Enum
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from fastapi_versioning import version
 from sqlalchemy.orm import Session
 
 from .. import auth
+from ..config import Config
 from ..crud import rankings, users
 from ..database import models, schemas
 from ..database.database import SessionLocal, engine
 from ..utils import actions as actions
 from ..utils.logger import LogManager
+from ..utils.ranking_cache import ranking_cache
 
 log_manager = LogManager()
 logger = log_manager.get_logger()
 
+config = Config()
+
 models.Base.metadata.create_all(bind=engine)
 
 router = APIRouter(
@@ -56,6 +62,7 @@ class RankingStatisticsTypes(str, Enum):
 def get_ranking_statistics(
     ranking: str = None,
     db: Session = Depends(get_db),
+    request: Request = None,
 ):
     """
     Get general rankings. To retrieve only specific rankings, add 'ranking' param with desired rankings, separated by comma (,).
@@ -71,36 +78,19 @@ def get_ranking_statistics(
     response = []
     for ranking_type in rankings_list:
         content = {}
-        if ranking_type == RankingStatisticsTypes.user_hours:
-            data = rankings.user_hours_players(db)
-        elif ranking_type == RankingStatisticsTypes.user_days:
-            data = rankings.user_days_played(db)
-        elif ranking_type == RankingStatisticsTypes.user_played_games:
-            data = rankings.user_played_games(db)
-        elif ranking_type == RankingStatisticsTypes.user_completed_games:
-            data = rankings.user_completed_games(db)
-        elif ranking_type == RankingStatisticsTypes.achievements:
-            data = rankings.user_ranking_achievements(db)
-        elif ranking_type == RankingStatisticsTypes.user_ratio:
-            data = rankings.user_ratio(db)
-        elif ranking_type == RankingStatisticsTypes.user_current_streak:
-            data = rankings.user_current_streak(db)
-        elif ranking_type == RankingStatisticsTypes.user_best_streak:
-            data = rankings.user_best_streak(db)
-        elif ranking_type == RankingStatisticsTypes.games_most_played:
-            data = rankings.games_most_played(db)
-        elif ranking_type == RankingStatisticsTypes.platform_played:
-            data = rankings.platform_played_games(db)
-        elif ranking_type == RankingStatisticsTypes.debt:
-            data = [{"message": "Debt is not implemented yet"}]
-        elif ranking_type == RankingStatisticsTypes.games_last_played:
-            data = rankings.games_last_played(db)
-        else:
-            data = {"message": "More rankings are coming"}
         content["type"] = ranking_type
-        content["data"] = data
+        content["data"] = ranking_cache.get(db, ranking_type)
         response.append(content)
-    return response
+    # Rankings only change on sync, so let clients revalidate with the ETag
+    body = json.dumps(response)
+    etag = '"' + hashlib.md5(body.encode()).hexdigest() + '"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=" + str(config.RANKINGS_CACHE_TTL),
+    }
+    if request is not None and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 class UserStatisticsTypes(str, Enum):
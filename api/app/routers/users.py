@@ -26,7 +26,6 @@ from ..utils.logger import LogManager
 
 log_manager = LogManager()
 logger = log_manager.get_logger()
-current_season = datetime.datetime.now().year
 
 models.Base.metadata.create_all(bind=engine)
 clockify_api = ClockifyApi()
@@ -151,7 +150,9 @@ async def add_game_to_user(
     user = users.get_user_by_username(db, username)
     if user is None:
         raise HTTPException(status_code=404, detail=msg.USER_NOT_EXISTS)
-    already_playing = users.get_game_by_id(db, user.id, game.game_id, current_season)
+    already_playing = users.get_game_by_id(
+        db, user.id, game.game_id, datetime.datetime.now().year
+    )
     if already_playing:
         raise HTTPException(status_code=409, detail=msg.USER_ALREADY_PLAYING)
     try:
@@ -196,7 +197,7 @@ async def complete_game(username: str, game_id: str, db: Session = Depends(get_d
     if user is None:
         logger.info("IS NONE")
         raise HTTPException(status_code=404, detail=msg.USER_NOT_EXISTS)
-    user_game = users.get_game_by_id(db, user.id, game_id, current_season)
+    user_game = users.get_game_by_id(db, user.id, game_id, datetime.datetime.now().year)
     if user_game is None:
         raise HTTPException(status_code=404, detail=msg.USER_NOT_PLAYING)
     if user_game.completed == 1:
@@ -219,7 +220,7 @@ async def rate_game(
     Rate game
     """
     user = users.get_user_by_username(db, username)
-    user_game = users.get_game_by_id(db, user.id, game_id, current_season)
+    user_game = users.get_game_by_id(db, user.id, game_id, datetime.datetime.now().year)
     if user_game is None:
         raise HTTPException(status_code=404, detail=msg.USER_NOT_PLAYING)
     try:
@@ -1,18 +1,20 @@
+import hashlib
+import json
+
 from sqlalchemy.orm import Session
 from ..utils import actions as actions
 
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi_versioning import version
 
+from ..crud import request_sync, time_entries, users
 from ..database.database import SessionLocal
 from ..utils import actions as actions
 from ..utils.logger import LogManager
 from ..config import Config
-import threading
 
 log_manager = LogManager()
 logger = log_manager.get_logger()
-process_lock = threading.Lock()
 config = Config()
 
 router = APIRouter(
@@ -28,42 +30,75 @@ def get_db():
         db.close()
 
 
-@router.post("/sync-data")
+@router.post("/sync-data", status_code=202)
 @version(1)
 async def webhook_sync(
     request: Request, db: Session = Depends(get_db), include_in_schema=False
 ):
-    """Sync using webhook"""
-    with process_lock:
-        headers = request.headers
+    """Sync using webhook (queued, runs on the worker)"""
+    headers = request.headers
+    try:
+        api_key = headers.get("x-api-key")
+        if api_key != config.API_KEY:
+            raise HTTPException(status_code=401, detail="Unauthorized")
+        user_id = None
+        event = None
+        delay = 0
+        entries = None
+        logger.info("Sync from cron")
+    except:
         try:
-            api_key = headers.get("x-api-key")
-            if api_key != config.API_KEY:
+            event = headers.get("clockify-webhook-event-type")
+            signature = headers.get("clockify-signature")
+            if signature in config.CLOCKIFY_SIGNATURES:
+                body = await request.body()
+                data = json.loads(body)
+                user_id = data["user"]["id"]
+                # Events of the user within the window are synced at once
+                delay = config.WEBHOOK_COALESCE_SECONDS
+                logger.info(f"Evet: {event}")
+                logger.info("Sync from Clockify TimeEntry")
+            else:
                 raise HTTPException(status_code=401, detail="Unauthorized")
-            user_id = None
-            event = None
-            logger.info("Sync from cron")
         except:
-            try:
-                event = headers.get("clockify-webhook-event-type")
-                signature = headers.get("clockify-signature")
-                if signature in config.CLOCKIFY_SIGNATURES:
-                    data = await request.json()
-                    user_id = data["user"]["id"]
-                    logger.info(f"Evet: {event}")
-                    logger.info("Sync from Clockify TimeEntry")
-                else:
-                    raise HTTPException(status_code=401, detail="Unauthorized")
-            except:
-                raise HTTPException(status_code=400, detail="Bad Request")
+            raise HTTPException(status_code=400, detail="Bad Request")
+
+        # Drop events delivered again by Clockify (retries). The event is
+        # saved with its changes, so a failed one can be delivered again
+        event_id = hashlib.sha256(str(event).encode() + body).hexdigest()
+        if not request_sync.register_webhook_event(db, event_id, commit=False):
+            db.rollback()
+            logger.info("Duplicated event " + event_id)
+            return {"message": "Duplicated event"}
+
+        # The payload is the changed entry, so apply it here and let the
+        # worker update the statistics without fetching Clockify again
+        user = users.get_user_by_clockify_id(db, user_id)
+        if user is None:
+            db.commit()
+            logger.warning("User not found: " + str(user_id))
+            return {"message": "User not found"}
+        entries = []
+        deleted = []
+        if "DELETED" in str(event):
+            time_entries.delete_time_entry(db, data["id"])
+            deleted = [data["id"]]
+        elif data.get("projectId"):
+            time_entries.write_clockify_entries(db, user, [data])
+            entries = [data]
+        else:
+            db.commit()
 
-        sync_result = await actions.sync_data(
-            user_clfy_id=user_id,
-            sync_season=False,
-            silent=False,
-            sync_all=False,
-            only_acive_users=True,
-            only_time_entries=False,
-            db=db,
-        )
-        return sync_result
+    params = {
+        "user_clfy_id": user_id,
+        "sync_season": False,
+        "silent": False,
+        "sync_all": False,
+        "only_acive_users": True,
+        "only_time_entries": False,
+    }
+    if entries is not None:
+        params["entries"] = entries
+        params["deleted"] = deleted
+    job = request_sync.enqueue_sync(db, params, delay=delay)
+    return {"message": "Sync queued", "job_id": job.id}
@@ -1,5 +1,6 @@
 import datetime
 from enum import Enum
+from typing import NamedTuple, Union
 
 from sqlalchemy import update
 from sqlalchemy.orm import Session
@@ -289,3 +290,165 @@ class AchievementsElems(Enum):
         + " es un animal nocturno, y por eso empieza a jugar de madrugada (a partir de las 2)."
         + " Bueno, lo más seguro es que juegue a todas horas.",
     }
+
+
+class AchievementMetric(Enum):
+    # Format -> KEY = threshold unit
+    PLAYED_TIME = "hours played on the season"
+    PLAYED_DAYS = "days played"
+    BEST_STREAK = "days of the best streak"
+    PLAYED_GAMES = "games played"
+    GAME_PLAYED_TIME = "hours played on one game"
+    DAY_PLAYED_TIME = "hours played on one day"
+    MIN_SESSION = "minutes of a session (at most)"
+    MAX_SESSION = "hours of a session (at least)"
+    SESSION_START_HOUR = "(start hour, end hour) window to start a session"
+    NEW_YEAR_SESSION = "session on new year's day (no threshold)"
+
+
+class AchievementRule(NamedTuple):
+    achievement: AchievementsElems
+    metric: AchievementMetric
+    threshold: Union[int, tuple, None]
+    # The message and the unlock include the game that unlocked it
+    with_game: bool = False
+
+
+# Achievements unlocked from the user metrics. To add one, add its
+# AchievementsElems and a rule with the metric and threshold
+ACHIEVEMENT_RULES = [
+    # Played days
+    AchievementRule(AchievementsElems.PLAYED_7_DAYS, AchievementMetric.PLAYED_DAYS, 7),
+    AchievementRule(
+        AchievementsElems.PLAYED_15_DAYS, AchievementMetric.PLAYED_DAYS, 15
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_30_DAYS, AchievementMetric.PLAYED_DAYS, 30
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_60_DAYS, AchievementMetric.PLAYED_DAYS, 60
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_100_DAYS, AchievementMetric.PLAYED_DAYS, 100
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_200_DAYS, AchievementMetric.PLAYED_DAYS, 200
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_300_DAYS, AchievementMetric.PLAYED_DAYS, 300
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_365_DAYS, AchievementMetric.PLAYED_DAYS, 365
+    ),
+    # Hours on game
+    AchievementRule(
+        AchievementsElems.PLAYED_100_HOURS_GAME,
+        AchievementMetric.GAME_PLAYED_TIME,
+        100,
+        with_game=True,
+    ),
+    # The following are not activated yet
+    # AchievementRule(
+    #     AchievementsElems.PLAYED_500_HOURS_GAME,
+    #     AchievementMetric.GAME_PLAYED_TIME,
+    #     500,
+    #     with_game=True,
+    # ),
+    # AchievementRule(
+    #     AchievementsElems.PLAYED_1000_HOURS_GAME,
+    #     AchievementMetric.GAME_PLAYED_TIME,
+    #     1000,
+    #     with_game=True,
+    # ),
+    # Total time
+    AchievementRule(
+        AchievementsElems.PLAYED_100_HOURS, AchievementMetric.PLAYED_TIME, 100
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_200_HOURS, AchievementMetric.PLAYED_TIME, 200
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_500_HOURS, AchievementMetric.PLAYED_TIME, 500
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_1000_HOURS, AchievementMetric.PLAYED_TIME, 1000
+    ),
+    # Session time
+    AchievementRule(
+        AchievementsElems.PLAYED_LESS_5_MIN_SESSION,
+        AchievementMetric.MIN_SESSION,
+        5,
+        with_game=True,
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_4_HOURS_SESSION,
+        AchievementMetric.MAX_SESSION,
+        4,
+        with_game=True,
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_8_HOURS_SESSION,
+        AchievementMetric.MAX_SESSION,
+        8,
+        with_game=True,
+    ),
+    # Games
+    AchievementRule(
+        AchievementsElems.PLAYED_10_GAMES, AchievementMetric.PLAYED_GAMES, 10
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_42_GAMES, AchievementMetric.PLAYED_GAMES, 42
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_50_GAMES, AchievementMetric.PLAYED_GAMES, 50
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_100_GAMES, AchievementMetric.PLAYED_GAMES, 100
+    ),
+    # Streaks
+    AchievementRule(AchievementsElems.STREAK_7_DAYS, AchievementMetric.BEST_STREAK, 7),
+    AchievementRule(
+        AchievementsElems.STREAK_15_DAYS, AchievementMetric.BEST_STREAK, 15
+    ),
+    AchievementRule(
+        AchievementsElems.STREAK_30_DAYS, AchievementMetric.BEST_STREAK, 30
+    ),
+    AchievementRule(
+        AchievementsElems.STREAK_60_DAYS, AchievementMetric.BEST_STREAK, 60
+    ),
+    AchievementRule(
+        AchievementsElems.STREAK_100_DAYS, AchievementMetric.BEST_STREAK, 100
+    ),
+    AchievementRule(
+        AchievementsElems.STREAK_200_DAYS, AchievementMetric.BEST_STREAK, 200
+    ),
+    AchievementRule(
+        AchievementsElems.STREAK_300_DAYS, AchievementMetric.BEST_STREAK, 300
+    ),
+    AchievementRule(
+        AchievementsElems.STREAK_365_DAYS, AchievementMetric.BEST_STREAK, 365
+    ),
+    # Time day
+    AchievementRule(
+        AchievementsElems.PLAYED_4_HOURS_DAY, AchievementMetric.DAY_PLAYED_TIME, 4
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_8_HOURS_DAY, AchievementMetric.DAY_PLAYED_TIME, 8
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_12_HOURS_DAY, AchievementMetric.DAY_PLAYED_TIME, 12
+    ),
+    AchievementRule(
+        AchievementsElems.PLAYED_16_HOURS_DAY, AchievementMetric.DAY_PLAYED_TIME, 16
+    ),
+    # Others
+    AchievementRule(
+        AchievementsElems.HAPPY_NEW_YEAR, AchievementMetric.NEW_YEAR_SESSION, None
+    ),
+    AchievementRule(
+        AchievementsElems.EARLY_RISER, AchievementMetric.SESSION_START_HOUR, (5, 6)
+    ),
+    AchievementRule(
+        AchievementsElems.NOCTURNAL, AchievementMetric.SESSION_START_HOUR, (2, 5)
+    ),
+]
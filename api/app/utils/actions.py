@@ -1,7 +1,9 @@
+import asyncio
 import datetime
 import json
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Union
 
 import requests
@@ -12,10 +14,15 @@ from ..config import Config
 from ..crud import clockify, games, rankings, time_entries, users
 from ..crud.achievements import Achievements
 from ..database import models, schemas
+from ..database.database import SessionLocal
 from . import my_utils as utils
+from .achievements import AchievementMetric
+from .change_set import ChangeSet
 from .clockify_api import ClockifyApi
 from ..utils import ai_prompts as prompts
 from .logger import LogManager
+from .statistics_rows import statistics_rows
+from .user_metrics import UserMetrics, get_user_metrics
 
 log_manager = LogManager()
 logger = log_manager.get_logger()
@@ -38,7 +45,15 @@ async def sync_data(
     sync_all: bool = False,
     only_acive_users: bool = True,
     only_time_entries: bool = False,
+    entries: list = None,
+    deleted: list = None,
 ):
+    """
+    Sync data from Clockify and update statistics, rankings and achievements.
+    If entries is set (Clockify entries of user_clfy_id, e.g. from webhooks),
+    they are used instead of fetching the user entries. Entries with an id on
+    deleted (already deleted from the DB) are skipped
+    """
     # logger.info("Sync data...")
     logger.info(only_acive_users)
     logger.info(only_time_entries)
@@ -66,6 +81,7 @@ async def sync_data(
             db.query(models.UserStatistics).delete()
             db.query(models.GameStatistics).delete()
             db.commit()
+            statistics_rows.clear()
         if sync_all:
             start_date = config.INITIAL_DATE
             silent = True
@@ -82,6 +98,7 @@ async def sync_data(
             db.query(models.GameStatistics).delete()
             # db.query(models.GameStatisticsHistorical).delete()
             db.commit()
+            statistics_rows.clear()
             # logger.info("Sync ALL data from " + start_date + "...")
     else:
         start_date = config.INITIAL_DATE
@@ -91,6 +108,7 @@ async def sync_data(
 
     achievements = Achievements(silent)
     clockify.sync_clockify_tags(db)
+    time_entries.rebuild_daily_rollup(db, force=sync_season or sync_all)
     achievements.populate_achievements(db)
     users_db = users.get_users(db, only_acive_users)
     # Clear tables on new year (season)
@@ -105,6 +123,12 @@ async def sync_data(
             db.query(models.UserStatistics).delete()
             db.query(models.GameStatistics).delete()
             db.commit()
+            statistics_rows.clear()
+    # Season and full syncs recompute everything, otherwise only the users
+    # and games with changed entries
+    change_set = ChangeSet(full=start_date is not None)
+    if entries is not None and deleted:
+        entries = [entry for entry in entries if entry["id"] not in deleted]
     logger.info("Current season: " + str(current_season))
     logger.info("Silent mode: " + str(silent))
     # logger.info("Sync clockify entries...")
@@ -117,7 +141,10 @@ async def sync_data(
                     users_db = [user_db]
                     # logger.debug("Delete older timers for " + str(user_db.name) + "...")
                     # delete_older_active_timers(db, user_db)
-                    delete_older_timers(db, user_db)
+                    # Webhook entries do not fetch Clockify again, so the
+                    # running timers would not be restored
+                    if entries is None:
+                        delete_older_timers(db, user_db)
                 else:
                     logger.warning("User not found")
                     return
@@ -131,114 +158,57 @@ async def sync_data(
         logger.info("########################")
         logger.info("##### USER CHECKS ######")
         logger.info("########################")
-        for user in users_db:
-            if user.name is not None and user.name != "":
-                user_name = str(user.name)
-            else:
-                user_name = str(user.username)
-            # logger.info("#### " + str(user_name) + " ####")
-
-            # Create user statistics entry (if needed)
-            users.create_user_statistics(db, user.id)
-            users.create_user_statistics_historical(db, user.id)
-
-            # Update clockify_id for user if has not been set and email matches with a valid user on Clockify
-            if user.clockify_id is None or not utils.check_hex(user.clockify_id):
-                users.update_clockify_id(
-                    db, user.username, clockify_api.get_user_by_email(user.email)
+        # Loaded at once to decide which users can be skipped
+        users_statistics = users.get_users_sync_statistics(
+            db, [user.id for user in users_db]
+        )
+        if config.SYNC_WORKERS > 1 and len(users_db) > 1:
+            change_set.update(
+                await sync_users_concurrently(
+                    users_db,
+                    achievements,
+                    start_date,
+                    only_time_entries,
+                    silent,
+                    change_set.full,
+                    users_statistics,
                 )
-
-            # Sync time_entries from Clockify with local DB
-            # logger.debug("Sync clockify entries for " + str(user_name) + "...")
-            total_entries = await utils.sync_clockify_entries(
-                db, user, start_date, only_time_entries, silent
-            )
-
-            # If only_time_entries is True, skip the rest of the checks and calculations
-            if only_time_entries:
-                # logger.info("Only time entries sync")
-                continue
-            # logger.info("THIS NOT SHOULD BE PRINTED")
-
-            # if total_entries < 1:
-            #     # logger.debug("No time entries for " + str(user_name))
-            #     continue
-
-            calculation_start_time = time.time()
-
-            # Update some user statistics
-            # logger.debug("Updating played days...")
-            played_days_season, real_played_days_season = time_entries.get_played_days(
-                db, user.id
-            )
-            # logger.info("Played days: " + str(len(played_days_season)))
-            # logger.info("Real played days: " + str(len(real_played_days_season)))
-            users.update_played_days(db, user.id, len(real_played_days_season))
-            # Check played days achievement
-            await achievements.user_played_total_days(
-                db, user, real_played_days_season, silent=silent
-            )
-            # logger.debug("Checking streaks for " + user.name)
-            (
-                best_streak_date,
-                best_streak,
-                current_streak,
-                best_unplayed_streak_date,
-                best_unplayed_streak,
-                current_unplayed_streak,
-            ) = streak_days(db, user, real_played_days_season, current_season)
-            # logger.info("Max gap: " + str(best_unplayed_streak))
-            # logger.info("Max gap date: " + str(best_unplayed_streak_date))
-            # logger.info("Current gap: " + str(current_unplayed_streak))
-            # return
-            await check_streaks(db, user, current_streak, best_streak, silent=silent)
-            # TODO: Check streaks achievement
-            users.update_streaks(
-                db,
-                user.id,
-                current_streak,
-                best_streak,
-                best_streak_date,
-                best_unplayed_streak,
-                best_unplayed_streak_date,
-                current_unplayed_streak,
             )
-            # logger.debug("Updating played time games and check achievements...")
-            played_time_games = time_entries.get_user_games_played_time(db, user.id)
-            for game in played_time_games:
-                if game[1] is not None:
-                    users.update_played_time_game(db, user.id, game[0], game[1])
-                    await achievements.user_played_hours_game(
-                        db=db,
-                        user=user,
-                        game_id=game[0],
-                        played_time=game[1],
-                        silent=silent,
+            # End the current transaction so the general checks see the
+            # changes written by the workers
+            db.commit()
+        else:
+            # Like the concurrent sync, the other users are synced before
+            # raising the first error
+            errors = []
+            for user in users_db:
+                try:
+                    await sync_user(
+                        db,
+                        user,
+                        achievements,
+                        start_date,
+                        only_time_entries,
+                        silent,
+                        current_season,
+                        change_set,
+                        entries,
+                        users_statistics.get(user.id),
                     )
-            # logger.debug("Updating played time...")
-            played_time = time_entries.get_user_played_time(db, user.id)
-            if played_time is not None:
-                played_time = played_time[1]
-            else:
-                played_time = 0
-            users.update_played_time(db, user.id, played_time)
-            # Other achievements
-            await achievements.user_played_total_time(
-                db, user, played_time, silent=silent
-            )
-            await achievements.user_session_time(db, user, silent=silent)
-            await achievements.user_played_total_games(db, user, silent=silent)
-            await achievements.user_streak(
-                db, user, best_streak, best_streak_date, silent=silent
-            )
-            await achievements.user_played_day_time(db, user, silent)
-            await achievements.happy_new_year(db, user, silent)
-            await achievements.early_riser(db, user, silent)
-            await achievements.nocturnal(db, user, silent)
-            await check_forgotten_timer(db, user)
-            calculation_end_time = time.time()
-            calculation_elapsed_time = calculation_end_time - calculation_start_time
-            logger.debug("Time spent on calculations: " + str(calculation_elapsed_time))
+                except Exception as e:
+                    db.rollback()
+                    logger.error(
+                        "Error syncing user " + str(user.username) + ": " + str(e)
+                    )
+                    errors.append(e)
+            if len(errors) > 0:
+                raise errors[0]
+        logger.info(
+            "Changed users: "
+            + ("all" if change_set.full else str(len(change_set.users)))
+            + ", games: "
+            + ("all" if change_set.full else str(len(change_set.games)))
+        )
 
         # If only_time_entries is True, skip the rest of the checks and calculations
         if not only_time_entries:
@@ -248,23 +218,34 @@ async def sync_data(
             logger.info("#### GENERAL CHECKS #####")
             logger.info("#########################")
 
-            # Update some game statistics
-            # logger.debug("Updating played time for games...")
-            played_time_games = time_entries.get_games_played_time(db)
-            for game in played_time_games:
-                games.update_total_played_time(db, game[0], game[1])
-
-            # Check rankings
-            # Notifications enabled
-            await ranking_games_hours(db, silent=silent)
-            await ranking_players_hours(db, silent=silent)
-
-            # Notifications disabled
-            # await ranking_games_hours(db, silent=True)
-            # await ranking_players_hours(db, silent=True)
+            # Without changed entries, played times and rankings are the same
+            if not change_set.is_empty():
+                # Update some game statistics
+                # logger.debug("Updating played time for games...")
+                played_time_games = time_entries.get_games_played_time(
+                    db, game_ids=None if change_set.full else list(change_set.games)
+                )
+                games.update_total_played_times(
+                    db,
+                    [(game[0], game[1]) for game in played_time_games],
+                    commit=False,
+                )
 
-            # Others
-            await achievements.teamwork(db, silent)
+                # Check rankings
+                # Notifications enabled
+                await ranking_games_hours(db, silent=silent)
+                await ranking_players_hours(db, silent=silent)
+                # Played times and rankings are written in a single transaction
+                db.commit()
+
+                # Notifications disabled
+                # await ranking_games_hours(db, silent=True)
+                # await ranking_players_hours(db, silent=True)
+
+                # Others
+                await achievements.teamwork(db, silent)
+                # Rankings only change here, so write a new rankings snapshot
+                write_ranking_snapshots(db)
             users_db = users.get_users(db)
             # Check weekly resume only on monday at 9:00
             if week_day == 0 and hour == 9 and minute == 0:
@@ -282,102 +263,388 @@ async def sync_data(
             await utils.send_message_to_admins(db, msg)
         logger.info("Elapsed time: " + str(elapsed_time))
     except Exception as e:
+        db.rollback()
         logger.error("Error on sync: " + str(e))
         await utils.send_message_to_admins(db, "Error on sync: " + str(e))
+        # The sync job is retried (or marked as failed) by the worker
+        raise
 
 
-def streak_days(
+def write_ranking_snapshots(db: Session):
+    """Write a new rankings snapshot (read by the API through ranking_cache)"""
+    try:
+        rankings.write_ranking_snapshots(db)
+    except Exception as e:
+        logger.error("Error writing rankings snapshot: " + str(e))
+
+
+async def sync_user(
     db: Session,
     user: models.User,
-    played_dates: list[models.TimeEntry],
+    achievements: Achievements,
+    start_date: str,
+    only_time_entries: bool,
+    silent: bool,
     current_season: int,
+    change_set: ChangeSet,
+    entries: list = None,
+    user_statistics=None,
 ):
     """
-    TODO:
+    Sync Clockify entries for one user (or only the given ones), adding the
+    changes to change_set, and update their statistics and achievements if
+    something changed (user_statistics is the row of
+    users.get_users_sync_statistics, None if the user has no statistics yet)
     """
-    max_streak = 0
-    start_streak_date = None
-    end_max_streak_date = None
-    current_streak = 0
+    if user.name is not None and user.name != "":
+        user_name = str(user.name)
+    else:
+        user_name = str(user.username)
+    # logger.info("#### " + str(user_name) + " ####")
+
+    # Create user statistics entry (if needed)
+    statistics_rows.ensure_users(db, [user.id])
+
+    # Update clockify_id for user if has not been set and email matches with a valid user on Clockify
+    if user.clockify_id is None or not utils.check_hex(user.clockify_id):
+        users.update_clockify_id(
+            db, user.username, clockify_api.get_user_by_email(user.email)
+        )
+
+    # Sync time_entries from Clockify with local DB
+    # logger.debug("Sync clockify entries for " + str(user_name) + "...")
+    if entries is None:
+        total_entries = await utils.sync_clockify_entries(
+            db, user, start_date, only_time_entries, silent, change_set
+        )
+    else:
+        total_entries = len(entries)
+        await time_entries.sync_clockify_entries_db(
+            db, user, entries, only_time_entries, silent, change_set
+        )
+        # Already written when received, so they are changes too
+        for entry in entries:
+            if entry.get("projectId"):
+                start = utils.change_timezone_clockify(entry["timeInterval"]["start"])
+                change_set.add(
+                    user.id,
+                    entry["projectId"],
+                    datetime.datetime.strptime(start, "%Y-%m-%d %H:%M:%S").date(),
+                )
+
+    # If only_time_entries is True, skip the rest of the checks and calculations
+    if only_time_entries:
+        # logger.info("Only time entries sync")
+        return
+    # logger.info("THIS NOT SHOULD BE PRINTED")
+
+    # if total_entries < 1:
+    #     # logger.debug("No time entries for " + str(user_name))
+    #     continue
+
+    if (
+        not change_set.has_user(user.id)
+        and user_statistics is not None
+        and user_statistics.recompute_from is not None
+    ):
+        # Entries changed outside the sync (like deleted ones), so any of the
+        # games of the season may have changed
+        for game_id in users.get_season_game_ids(db, user.id, current_season):
+            change_set.add(user.id, game_id)
+    if (
+        not change_set.has_user(user.id)
+        and user_statistics is not None
+        and user_statistics.statistics_date == datetime.date.today()
+    ):
+        # Nothing changed since the last statistics update (current streaks
+        # still need it once a day)
+        await check_forgotten_timer(db, user)
+        return
+    # Recomputed once a day even without changes (current streaks), so the
+    # rankings are updated too
+    change_set.add(user.id)
+
+    calculation_start_time = time.time()
+    # Achievement checks work on a snapshot of the unlocked achievements, and
+    # new unlocks are written at once at the end
+    achievements.load_user_achievements(db, user.id)
     try:
-        if len(played_dates) == 0:
-            end_max_streak_date = datetime.datetime.strptime(
-                str(current_season) + "-01-01", "%Y-%m-%d"
-            )
-            return end_max_streak_date, 0, 0, end_max_streak_date, 0, 0
-        elif len(played_dates) == 1:
-            end_max_streak_date = played_dates[0]
-            max_streak = 1
-            current_streak = 1
-        for i in range(1, len(played_dates)):
-            # Check diff between current and last date
-            diff = (played_dates[i] - played_dates[i - 1]).days
-            if diff == 1:
-                if current_streak == 0:
-                    start_streak_date = played_dates[i - 1]
-                current_streak += 1
-            else:
-                if current_streak >= max_streak:
-                    max_streak = current_streak
-                    end_max_streak_date = played_dates[i - 1]
-                current_streak = 0
-        # Check last date to add this day to the streak. If last d
-        today = datetime.date.today()
-        # Add last elem to streak if its yesterday
-        if (today - played_dates[-1]).days == 1:
-            current_streak += 1
-        # Add today to streak if the last elem is today
-        if (today - played_dates[-1]).days == 0:
-            current_streak += 1
-
-        # Check if current streak (with today) is longer than best (without today)
-        if current_streak > max_streak:
-            max_streak = current_streak
-            end_max_streak_date = played_dates[-1]
-
-        # Check is there is more than 1 day without play
-        if (today - played_dates[-1]).days > 1:
-            current_streak = 0
-    except Exception as e:
-        logger.error("Error calculating streak days: " + str(e))
+        # All the statistics come from a single fetch of the season entries
+        user_metrics = get_user_metrics(db, user.id, current_season)
+        # Update played days and streaks
+        streak_state, new_played_dates = get_user_streak_state(
+            db, user, current_season, user_metrics
+        )
+        (
+            best_streak_date,
+            best_streak,
+            current_streak,
+            best_unplayed_streak_date,
+            best_unplayed_streak,
+            current_unplayed_streak,
+        ) = streak_days(streak_state, current_season)
+        await check_streaks(db, user, current_streak, best_streak, silent=silent)
+        # TODO: Check streaks achievement
+        users.update_streaks(
+            db,
+            user.id,
+            current_streak,
+            best_streak,
+            best_streak_date,
+            best_unplayed_streak,
+            best_unplayed_streak_date,
+            current_unplayed_streak,
+            streak_state=streak_state,
+            commit=False,
+        )
+        # logger.debug("Updating played time games and check achievements...")
+        played_time_games = user_metrics.get_games_played_time()
+        users.update_played_time_games(
+            db,
+            [(user.id, game[0], game[1]) for game in played_time_games],
+            commit=False,
+        )
+        # logger.debug("Updating played time...")
+        played_time = user_metrics.played_time
+        users.update_played_time(db, user.id, played_time, commit=False)
+        # All the statistics of the user are written in a single transaction
+        db.commit()
+        # Achievements (with the metrics already computed)
+        achievement_metrics = user_metrics.get_achievement_metrics()
+        achievement_metrics[AchievementMetric.PLAYED_DAYS] = (
+            streak_state["played_days"],
+            new_played_dates,
+        )
+        achievement_metrics[AchievementMetric.BEST_STREAK] = (
+            best_streak,
+            best_streak_date,
+        )
+        await achievements.check_user_achievements(
+            db, user, achievement_metrics, silent=silent
+        )
+        await check_forgotten_timer(db, user)
+    except Exception:
+        # Do not leave the statistics of the user partially applied
+        db.rollback()
+        raise
+    finally:
+        achievements.save_user_achievements(db, user.id)
+    calculation_end_time = time.time()
+    calculation_elapsed_time = calculation_end_time - calculation_start_time
+    logger.debug("Time spent on calculations: " + str(calculation_elapsed_time))
+
+
+def sync_user_worker(
+    user_id: int,
+    achievements: Achievements,
+    start_date: str,
+    only_time_entries: bool,
+    silent: bool,
+    full: bool,
+    user_statistics=None,
+) -> ChangeSet:
+    """
+    Run sync_user in a worker thread, with its own DB session and event loop.
+    Returns the changes of the user
+    """
+    change_set = ChangeSet(full)
 
-    # Unplayed days
-    max_gap = 0
-    end_max_gap_date = None
-    current_gap = 0
+    async def run(db: Session):
+        try:
+            user = users.get_user_by_id(db, user_id)
+            await sync_user(
+                db,
+                user,
+                achievements,
+                start_date,
+                only_time_entries,
+                silent,
+                datetime.datetime.now().year,
+                change_set,
+                user_statistics=user_statistics,
+            )
+        finally:
+            # The async clients are bound to this worker's event loop
+            await clockify_api.aclose()
+            await utils.rawg_api.aclose()
 
+    db = SessionLocal()
     try:
-        for i in range(1, len(played_dates)):
-            gap = (played_dates[i] - played_dates[i - 1]).days - 1
-            if gap > 0:
-                # Update current gap
-                current_gap = gap
-                # Update max gap
-                if gap >= max_gap:
-                    max_gap = gap
-                    end_max_gap_date = played_dates[i]
-
-        # Check unplayed days for today
-        last_gap = (today - played_dates[-1]).days - 1
-        if last_gap > 0:
-            current_gap = last_gap
-            # If last gap is longer than max gap, update max gap
-            if last_gap > max_gap:
-                max_gap = last_gap
-                end_max_gap_date = today
-    except Exception as e:
-        logger.error("Error calculating unplayed days: " + str(e))
+        asyncio.run(run(db))
+    finally:
+        db.close()
+    return change_set
+
+
+async def sync_users_concurrently(
+    users_db: list[models.User],
+    achievements: Achievements,
+    start_date: str,
+    only_time_entries: bool,
+    silent: bool,
+    full: bool = False,
+    users_statistics: dict = None,
+) -> ChangeSet:
+    """
+    Sync users in a pool of SYNC_WORKERS threads and return their changes.
+    Raises the first error (if any) once all the users have finished.
+    """
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=config.SYNC_WORKERS) as executor:
+        results = await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    executor,
+                    sync_user_worker,
+                    user.id,
+                    achievements,
+                    start_date,
+                    only_time_entries,
+                    silent,
+                    full,
+                    (users_statistics or {}).get(user.id),
+                )
+                for user in users_db
+            ],
+            return_exceptions=True,
+        )
+    errors = []
+    change_set = ChangeSet(full)
+    for user, result in zip(users_db, results):
+        if isinstance(result, Exception):
+            logger.error("Error syncing user " + str(user.username) + ": " + str(result))
+            errors.append(result)
+        else:
+            change_set.update(result)
+    if len(errors) > 0:
+        raise errors[0]
+    return change_set
+
+
+def empty_streak_state() -> dict:
+    return {
+        "played_days": 0,
+        "last_played_date": None,
+        "last_played_streak": 0,
+        "last_unplayed_streak": 0,
+        "best_streak": 0,
+        "best_streak_date": None,
+        "best_unplayed_streak": 0,
+        "best_unplayed_streak_date": None,
+    }
+
+
+def get_streak_state(user_statistics: models.UserStatistics) -> dict:
+    """Get the persisted streak state from the user statistics"""
+    if user_statistics is None or user_statistics.last_played_date is None:
+        return empty_streak_state()
+    return {
+        "played_days": user_statistics.played_days or 0,
+        "last_played_date": user_statistics.last_played_date,
+        "last_played_streak": user_statistics.last_played_streak or 0,
+        "last_unplayed_streak": user_statistics.last_unplayed_streak or 0,
+        "best_streak": user_statistics.best_streak or 0,
+        "best_streak_date": user_statistics.best_streak_date,
+        "best_unplayed_streak": user_statistics.best_unplayed_streak or 0,
+        "best_unplayed_streak_date": user_statistics.best_unplayed_streak_date,
+    }
+
+
+def advance_streaks(state: dict, played_dates: list[datetime.date]) -> dict:
+    """
+    Advance the streak state with the (sorted) played dates after its last
+    played date
+    """
+    state = dict(state)
+    for played_date in played_dates:
+        last_played_date = state["last_played_date"]
+        if last_played_date is not None and played_date <= last_played_date:
+            continue
+        if last_played_date is None:
+            streak = 1
+        else:
+            gap = (played_date - last_played_date).days - 1
+            if gap == 0:
+                streak = state["last_played_streak"] + 1
+            else:
+                streak = 1
+                state["last_unplayed_streak"] = gap
+                if gap >= state["best_unplayed_streak"]:
+                    state["best_unplayed_streak"] = gap
+                    state["best_unplayed_streak_date"] = played_date
+        if streak >= state["best_streak"]:
+            state["best_streak"] = streak
+            state["best_streak_date"] = played_date
+        state["last_played_streak"] = streak
+        state["last_played_date"] = played_date
+        state["played_days"] += 1
+    return state
+
+
+def streak_days(state: dict, current_season: int):
+    """
+    Get the best/current streaks and unplayed gaps (as of today) from the
+    streak state
+    """
+    if state["last_played_date"] is None:
+        season_start = datetime.date(current_season, 1, 1)
+        return season_start, 0, 0, season_start, 0, 0
+    today = datetime.date.today()
+    days_since_last_played = (today - state["last_played_date"]).days
+    # The streak is alive if the user played today or yesterday
+    if days_since_last_played <= 1:
+        current_streak = state["last_played_streak"]
+    else:
+        current_streak = 0
+    # Unplayed days until today
+    current_gap = days_since_last_played - 1
+    best_gap = state["best_unplayed_streak"]
+    best_gap_date = state["best_unplayed_streak_date"]
+    if current_gap > 0:
+        if current_gap > best_gap:
+            best_gap = current_gap
+            best_gap_date = today
+    else:
+        current_gap = state["last_unplayed_streak"]
 
     return (
-        end_max_streak_date,
-        max_streak,
+        state["best_streak_date"],
+        state["best_streak"],
         current_streak,
-        end_max_gap_date,
-        max_gap,
+        best_gap_date,
+        best_gap,
         current_gap,
     )
 
 
+def get_user_streak_state(
+    db: Session, user: models.User, current_season: int, user_metrics: UserMetrics
+):
+    """
+    Advance the persisted streak state of the user with the days played since
+    its last played date. Recomputes it from the season start if there is no
+    state or an entry on/before the last played date changed.
+    Returns the new state and the last played dates (at least the last one)
+    """
+    user_statistics = users.get_user_statistics(db, user.id)
+    state = get_streak_state(user_statistics)
+    last_played_date = state["last_played_date"]
+    if (
+        last_played_date is not None
+        and last_played_date.year == current_season
+        and (
+            user_statistics.recompute_from is None
+            or user_statistics.recompute_from >= last_played_date
+        )
+    ):
+        played_dates = user_metrics.get_played_days(last_played_date)
+        # The last played date can only be lost if its entries were edited
+        if len(played_dates) > 0 and played_dates[0] == last_played_date:
+            return advance_streaks(state, played_dates[1:]), played_dates
+    played_dates = user_metrics.get_played_days()
+    return advance_streaks(empty_streak_state(), played_dates), played_dates
+
+
 async def check_streaks(
     db: Session,
     user: models.User,
@@ -514,10 +781,11 @@ async def ranking_games_hours(db: Session, silent: bool):
         logger.error("Error in check ranking games: " + str(e))
     # logger.debug("Updating games ranking...")
     most_played = games.get_most_played_time(db)
-    i = 1
-    for game in most_played:
-        games.update_current_ranking_hours(db, i, game.game_id)
-        i += 1
+    games.update_current_rankings_hours(
+        db,
+        [(game.game_id, i) for i, game in enumerate(most_played, start=1)],
+        commit=False,
+    )
 
 
 async def ranking_players_hours(db: Session, silent: bool):
@@ -539,6 +807,7 @@ async def ranking_players_hours(db: Session, silent: bool):
     else:
         logger.info("Changes in player ranking")
         msg = "📣 Actualización del ránking de horas 📣\n"
+        rankings = []
         for i, player in enumerate(played_time_db):
             name = str(users.get_user_by_id(db, player.user_id).name)
             hours = player.played_time
@@ -577,17 +846,19 @@ async def ranking_players_hours(db: Session, silent: bool):
                 + ")"
                 + "\n"
             )
-            users.update_current_ranking_hours(db, i + 1, player.user_id)
+            rankings.append((player.user_id, i + 1))
+        users.update_current_rankings_hours(db, rankings, commit=False)
         await utils.send_message(
             msg, silent, openai=True, system_prompt=prompts.RANKING_USER_PROMPT
         )
         logger.info(msg)
     # logger.debug("Updating players ranking...")
     current_ranking = users.current_ranking_hours(db)
-    i = 1
-    for user in current_ranking:
-        users.update_current_ranking_hours(db, i, user.user_id)
-        i += 1
+    users.update_current_rankings_hours(
+        db,
+        [(user.user_id, i) for i, user in enumerate(current_ranking, start=1)],
+        commit=False,
+    )
 
 
 ##################
@@ -620,7 +891,7 @@ def delete_older_active_timers(db: Session, user: models.User = None):
     for timer in active_timers:
         # logger.info("Deleting timer " + str(timer.id))
         db.delete(timer)
-        db.commit()
+    db.commit()
 
 
 def delete_older_timers(db: Session, user: models.User = None):
@@ -630,7 +901,7 @@ def delete_older_timers(db: Session, user: models.User = None):
     for timer in active_timers:
         # logger.info("Deleting timer " + str(timer.id))
         db.delete(timer)
-        db.commit()
+    db.commit()
 
 
 async def weekly_resume(
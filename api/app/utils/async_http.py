@@ -0,0 +1,79 @@
+import asyncio
+import datetime
+import weakref
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+
+def get_retry_delay(response: httpx.Response, retries: int) -> float:
+    """
+    Seconds to wait before retrying: the Retry-After header (in seconds or as
+    an HTTP date) or, without a valid one, the exponential backoff delay
+    """
+    backoff = 0.5 * 2**retries
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return backoff
+    try:
+        return max(float(retry_after), 0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(retry_after)
+        now = datetime.datetime.now(date.tzinfo)
+        return max((date - now).total_seconds(), 0)
+    except (TypeError, ValueError):
+        return backoff
+
+
+class AsyncClients:
+    """
+    Async clients are bound to the event loop that created them (sync workers
+    run their own loop), so keep one per loop, created with new_client
+    """
+
+    def __init__(self, new_client) -> None:
+        self.new_client = new_client
+        self.clients = weakref.WeakKeyDictionary()
+
+    def get(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self.clients.get(loop)
+        if client is None or client.is_closed:
+            client = self.new_client()
+            self.clients[loop] = client
+        return client
+
+    async def aclose(self):
+        """Close the client of the running event loop (if any)"""
+        client = self.clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+async def send_with_retries(
+    client: httpx.AsyncClient, method: str, url: str, max_retries: int, **kwargs
+) -> httpx.Response:
+    """
+    Send a request, retrying with exponential backoff (or Retry-After) on
+    429/5xx responses and connection errors. Returns the last response
+    """
+    retries = 0
+    while True:
+        try:
+            response = await client.request(method, url, **kwargs)
+            if (
+                response.status_code not in RETRY_STATUS_CODES
+                or retries >= max_retries
+            ):
+                return response
+            delay = get_retry_delay(response, retries)
+        except httpx.TransportError:
+            if retries >= max_retries:
+                raise
+            delay = 0.5 * 2**retries
+        retries += 1
+        await asyncio.sleep(delay)
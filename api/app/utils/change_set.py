@@ -0,0 +1,34 @@
+import datetime
+
+
+class ChangeSet:
+    """
+    Users, games and days touched by the synced time entries, so statistics
+    and achievements are only recomputed for them. A full change set (season
+    or full syncs) means everything may have changed
+    """
+
+    def __init__(self, full: bool = False) -> None:
+        self.full = full
+        self.users = set()
+        self.games = set()
+        self.days = set()
+
+    def add(self, user_id: int, game_id: str = None, day: datetime.date = None):
+        self.users.add(user_id)
+        if game_id is not None:
+            self.games.add(game_id)
+        if day is not None:
+            self.days.add(day)
+
+    def update(self, other: "ChangeSet"):
+        self.full = self.full or other.full
+        self.users.update(other.users)
+        self.games.update(other.games)
+        self.days.update(other.days)
+
+    def has_user(self, user_id: int) -> bool:
+        return self.full or user_id in self.users
+
+    def is_empty(self) -> bool:
+        return not self.full and len(self.users) == 0 and len(self.games) == 0
@@ -1,11 +1,16 @@
+import asyncio
 import datetime
 import json
 from datetime import timezone
 
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from ..config import Config
 from . import my_utils as utils
+from .async_http import RETRY_STATUS_CODES, AsyncClients, send_with_retries
 from .logger import LogManager
 
 log_manager = LogManager()
@@ -13,7 +18,41 @@ logger = log_manager.get_logger()
 
 config = Config()
 time_format = "%Y-%m-%dT%H:%M:%SZ"
-current_season = datetime.datetime.now().year
+TIME_ENTRIES_PAGE_SIZE = 500
+
+# Shared keep-alive session for the blocking calls. Only idempotent methods are
+# retried, so projects and time entries are never created twice.
+http_session = requests.Session()
+http_session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_maxsize=config.SYNC_WORKERS * 2,
+        max_retries=Retry(
+            total=config.CLOCKIFY_MAX_RETRIES,
+            backoff_factor=0.5,
+            status_forcelist=RETRY_STATUS_CODES,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        ),
+    ),
+)
+
+
+def get_entry_start(entry) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(entry["timeInterval"]["start"])
+
+
+async_clients = AsyncClients(
+    lambda: httpx.AsyncClient(
+        base_url=config.CLOCKIFY_BASEURL,
+        http2=True,
+        timeout=config.CLOCKIFY_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=config.CLOCKIFY_CONCURRENT_PAGES * 2,
+            max_keepalive_connections=config.CLOCKIFY_CONCURRENT_PAGES,
+        ),
+    )
+)
 
 
 class ClockifyApi:
@@ -36,14 +75,20 @@ class ClockifyApi:
             payload = data
             try:
                 if payload is not None:
-                    request = requests.request(
-                        method, url, headers=headers, json=payload
+                    request = http_session.request(
+                        method,
+                        url,
+                        headers=headers,
+                        json=payload,
+                        timeout=config.CLOCKIFY_TIMEOUT,
                     )
                 else:
-                    request = requests.request(method, url, headers=headers)
+                    request = http_session.request(
+                        method, url, headers=headers, timeout=config.CLOCKIFY_TIMEOUT
+                    )
             except Exception as e:
-                logger.error("Error on send request on clockify")
-                exit(e)
+                logger.error("Error on send request on clockify: " + str(e))
+                raise
 
             if not request.ok:
                 logger.error(
@@ -51,6 +96,40 @@ class ClockifyApi:
                 )
             return request
 
+    def get_async_client(self) -> httpx.AsyncClient:
+        return async_clients.get()
+
+    async def aclose(self):
+        """Close the async client of the running event loop (if any)"""
+        await async_clients.aclose()
+
+    async def send_clockify_request_async(self, method, endpoint, data, api_key):
+        """
+        Async version of send_clockify_request, with retries (exponential
+        backoff) on 429/5xx responses and connection errors
+        """
+        if api_key is None:
+            raise Exception("Clockify API key not set")
+        headers = {"X-API-KEY": api_key}
+        try:
+            response = await send_with_retries(
+                self.get_async_client(),
+                method,
+                endpoint,
+                config.CLOCKIFY_MAX_RETRIES,
+                headers=headers,
+                json=data,
+            )
+        except httpx.TransportError as e:
+            logger.error("Error on send request on clockify: " + str(e))
+            raise
+
+        if not response.is_success:
+            logger.error(
+                "Error({}): {}".format(response.status_code, response.content)
+            )
+        return response
+
     def add_project(self, project_name):
         method = self.POST
         data = {"name": project_name}
@@ -134,13 +213,25 @@ class ClockifyApi:
             else:
                 return self.GENERIC_ERROR
 
-    def get_time_entries(self, clockify_user_id, start_date=None):
+    async def iter_time_entries(self, clockify_user_id, start_date=None, since=None):
+        """Get time entries for a Clockify user, page by page (as they are
+        received, unordered), so they are never all in memory at once
+
+        Args:
+            clockify_user_id (str): Clockify user ID
+            start_date (str, optional): Sync from this date (YYYY-MM-DD). Defaults to None.
+            since (datetime, optional): Sync from this UTC datetime (incremental sync).
+                                        Ignored if start_date is set. Defaults to None.
+        """
         # logger.debug("Getting time entries...")
+        current_season = datetime.datetime.now().year
         if clockify_user_id is None or not utils.check_hex(clockify_user_id):
-            return []
+            return
         # start must be in format yyyy-MM-ddThh:mm:ssZ
         try:
-            if start_date is None:
+            if start_date is None and since is not None:
+                start = since.strftime(time_format)
+            elif start_date is None:
                 date = datetime.datetime.now()
                 date = date.replace(hour=0, minute=0, second=0)
                 start = date - datetime.timedelta(days=config.SYNC_DAYS)
@@ -150,37 +241,52 @@ class ClockifyApi:
                 start = date - datetime.timedelta()
                 start = start.strftime(time_format)
             page = 0
-            entries = []
             has_entries = True
 
+            # Request CLOCKIFY_CONCURRENT_PAGES pages at once, until a page
+            # is not full
             while has_entries:
-                page += 1
-                endpoint = "/workspaces/{}/user/{}/time-entries?page-size=500&page={}&start={}".format(
-                    config.CLOCKIFY_WORKSPACE, clockify_user_id, page, start
-                )
-                response = self.send_clockify_request(
-                    self.GET, endpoint, None, config.CLOCKIFY_ADMIN_API_KEY
+                pages = range(page + 1, page + 1 + config.CLOCKIFY_CONCURRENT_PAGES)
+                page = pages[-1]
+                responses = await asyncio.gather(
+                    *[
+                        self.send_clockify_request_async(
+                            self.GET,
+                            "/workspaces/{}/user/{}/time-entries?page-size={}&page={}&start={}".format(
+                                config.CLOCKIFY_WORKSPACE,
+                                clockify_user_id,
+                                TIME_ENTRIES_PAGE_SIZE,
+                                page_number,
+                                start,
+                            ),
+                            None,
+                            config.CLOCKIFY_ADMIN_API_KEY,
+                        )
+                        for page_number in pages
+                    ]
                 )
-                if len(response.json()) > 0 and response.status_code == 200:
-                    for entry in response.json():
-                        entries.append(entry)
-                else:
-                    has_entries = False
-
-            def get_date(elem):
-                return datetime.datetime.fromisoformat(elem["timeInterval"]["start"])
-
-            ordered_entries = sorted(entries, key=get_date)
-
-            # Filter entries by season. Only get the current season
-            if start_date is None:
-                filtered_entries = [
-                    entry for entry in ordered_entries 
-                    if get_date(entry).year == current_season
-                ]
-
-                return filtered_entries
-            return ordered_entries
+                for response in responses:
+                    # A missing page would leave the sync incomplete
+                    if response.status_code != 200:
+                        raise Exception(
+                            "Error({}) getting time entries".format(
+                                response.status_code
+                            )
+                        )
+                    page_entries = response.json()
+                    if len(page_entries) < TIME_ENTRIES_PAGE_SIZE:
+                        has_entries = False
+                    # Filter entries by season. Only get the current season
+                    if start_date is None:
+                        page_entries = [
+                            entry
+                            for entry in page_entries
+                            if get_entry_start(entry).year == current_season
+                        ]
+                    if len(page_entries) > 0:
+                        yield page_entries
+                    if not has_entries:
+                        break
         except Exception as e:
             logger.error("Error getting time entries: " + str(e))
             raise e
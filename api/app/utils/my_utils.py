@@ -1,23 +1,23 @@
 import datetime
-import json
 import re
 from io import BytesIO
 from zoneinfo import ZoneInfo
 import time
 
-import requests
 import telegram
 from dateutil.parser import isoparse
 from howlongtobeatpy import HowLongToBeat
 from PIL import Image
-from sqlalchemy import asc, create_engine, desc, func, select, text, update
+from sqlalchemy import and_, asc, create_engine, desc, func, select, text, update
 from sqlalchemy.orm import Session
 
 from ..config import Config
 from ..crud import games, time_entries, users
 from ..database import models, schemas
 from .achievements import AchievementsElems
+from .change_set import ChangeSet
 from .clockify_api import ClockifyApi
+from .rawg_api import RawgApi
 from ..clients.open_ai import OpenAIClient
 from ..utils import ai_prompts as prompts
 from ..utils.logger import LogManager
@@ -27,6 +27,7 @@ logger = log_manager.get_logger()
 
 oai_client = OpenAIClient()
 clockify_api = ClockifyApi()
+rawg_api = RawgApi()
 config = Config()
 
 
@@ -151,6 +152,20 @@ def get_current_week_range_dates():
     return first_day_current_week.date(), last_day_current_week.date()
 
 
+def season_range(season: int):
+    """Half-open [start, end) datetime range of a season"""
+    return datetime.datetime(season, 1, 1), datetime.datetime(season + 1, 1, 1)
+
+
+def in_season(column, season: int):
+    """
+    Filter for column in season. Unlike extract("year", column), it can use
+    the indexes on column
+    """
+    start, end = season_range(season)
+    return and_(column >= start, column < end)
+
+
 def day_of_the_year(date):
     date = datetime.datetime.strptime(date, "%Y-%m-%d %H:%M:%S")
     return date.timetuple().tm_yday
@@ -172,14 +187,14 @@ def date_from_datetime(datetime: str):
     return datetime.split(" ")[0]
 
 
-async def get_game_info(game: str):
+async def get_game_info(game: str, db: Session = None, raise_errors: bool = False):
     # Rawg
-    game_request = requests.get(config.RAWG_URL + game)
-    # logger.debug("RAWG:")
-    # logger.debug(json.loads(game_request.content)["results"][0])
     try:
-        rawg_content = json.loads(game_request.content)["results"][0]
-    except Exception:
+        rawg_content = await rawg_api.search(game, db)
+    except Exception as e:
+        if raise_errors:
+            raise e
+        logger.error(str(e))
         rawg_content = None
     # HLTB
     game = game.replace(":", "")
@@ -196,7 +211,9 @@ async def get_game_info(game: str):
     return {"rawg": rawg_content, "hltb": hltb_content}
 
 
-async def get_new_game_info(game) -> schemas.NewGame:
+async def get_new_game_info(
+    game, db: Session = None, raise_errors: bool = False
+) -> schemas.NewGame:
     # logger.debug("Get new game info from rawg and hltb...")
     game_name = game["name"]
     project_id = game["id"]
@@ -205,10 +222,19 @@ async def get_new_game_info(game) -> schemas.NewGame:
     steam_id = ""
     dev = ""
     avg_time = 0
-    game_info = await get_game_info(game_name)
+    game_info = await get_game_info(game_name, db, raise_errors)
     # logger.debug("Game info: " + str(game_info))
     rawg_info = game_info["rawg"]
     hltb_info = game_info["hltb"]
+    if rawg_info is None:
+        # Not found on RAWG, keep the Clockify name
+        rawg_info = {
+            "name": game_name,
+            "released": None,
+            "genres": [],
+            "background_image": None,
+            "slug": None,
+        }
     game_name = rawg_info["name"]
     released = rawg_info["released"]
     try:
@@ -249,30 +275,134 @@ async def get_new_game_info(game) -> schemas.NewGame:
     return new_game
 
 
+def get_entries_watermark(entries, previous_watermark=None) -> datetime.datetime:
+    """
+    Get the UTC start of the oldest entry that may still change: the oldest
+    running timer or, if there is none, the most recent entry.
+    """
+    running = []
+    latest = None
+    for entry in entries:
+        start = isoparse(entry["timeInterval"]["start"])
+        start = start.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        if entry["timeInterval"]["end"] is None:
+            running.append(start)
+        if latest is None or start > latest:
+            latest = start
+    if len(running) > 0:
+        return min(running)
+    if latest is None:
+        if previous_watermark is not None:
+            return previous_watermark
+        return datetime.datetime.utcnow()
+    if previous_watermark is not None and previous_watermark > latest:
+        return previous_watermark
+    return latest
+
+
+def get_watermark_entries(entries) -> list:
+    """
+    Entries that can set the watermark (the running timers and the most
+    recent entry), so it can be computed across pages without keeping them
+    """
+    running = []
+    latest = None
+    latest_start = None
+    for entry in entries:
+        if entry["timeInterval"]["end"] is None:
+            running.append(entry)
+        start = isoparse(entry["timeInterval"]["start"])
+        if latest_start is None or start > latest_start:
+            latest = entry
+            latest_start = start
+    if latest is not None and latest not in running:
+        running.append(latest)
+    return running
+
+
 async def sync_clockify_entries(
     db: Session,
     user: models.User,
     date: str = None,
     only_time_entries: bool = False,
     silent: bool = False,
+    change_set: ChangeSet = None,
 ):
+    if user.clockify_id is None or not check_hex(user.clockify_id):
+        # Nothing is fetched, so the sync state is kept
+        return 0
     try:
         start_time = time.time()
         total_entries = 0
-        entries = clockify_api.get_time_entries(user.clockify_id, date)
-        total_entries = len(entries)
-        logger.info("Sync " + str(total_entries) + " entries for " + str(user.name))
+        # Default sync only pulls the entries after the last watermark, except
+        # when a periodic full reconciliation (SYNC_DAYS) is due
+        since = None
+        full_sync = True
+        sync_state = None
+        if date is None:
+            sync_state = time_entries.get_sync_state(db, user.id)
+            if not time_entries.needs_full_reconciliation(sync_state):
+                full_sync = False
+                since = sync_state.watermark - datetime.timedelta(
+                    minutes=config.SYNC_OVERLAP_MINUTES
+                )
+        # Ingest every page as it is received, so a full season is never
+        # held in memory at once
+        watermark_entries = []
+        platform_starts = {}
+        try:
+            async for page_entries in clockify_api.iter_time_entries(
+                user.clockify_id, date, since=since
+            ):
+                total_entries += len(page_entries)
+                watermark_entries = get_watermark_entries(
+                    watermark_entries + page_entries
+                )
+                await time_entries.sync_clockify_entries_db(
+                    db,
+                    user,
+                    page_entries,
+                    only_time_entries,
+                    silent,
+                    change_set,
+                    platform_starts,
+                )
+        except Exception as e:
+            # The pages after the failed one were not read, so the watermark
+            # and the last full sync must not move
+            logger.error(
+                "Sync of "
+                + str(user.name)
+                + " stopped after "
+                + str(total_entries)
+                + " entries: "
+                + str(e)
+            )
+            raise
+        logger.info(
+            "Sync "
+            + str(total_entries)
+            + " entries for "
+            + str(user.name)
+            + (" (full)" if full_sync else " (incremental)")
+        )
+        # Every page was fetched and ingested
+        previous_watermark = sync_state.watermark if sync_state is not None else None
+        time_entries.update_sync_state(
+            db,
+            user.id,
+            get_entries_watermark(watermark_entries, previous_watermark),
+            full_sync,
+        )
         if total_entries == 0:
             return 0
-        await time_entries.sync_clockify_entries_db(
-            db, user, entries, only_time_entries, silent
-        )
         end_time = time.time()
         elapsed_time = end_time - start_time
         logger.debug("Elapsed time for sync time entries: " + str(elapsed_time))
         return total_entries
     except Exception as e:
         logger.error("Error syncing clockify entries: " + str(e))
+        raise
 
 
 def convert_blob_to_image(
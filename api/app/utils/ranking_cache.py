@@ -0,0 +1,51 @@
+import datetime
+import threading
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from ..crud import rankings
+
+
+class RankingCache:
+    """
+    In-process cache of the rankings, read from the latest ranking snapshot
+    version and keyed by ranking type, season and version. The latest version
+    is checked on every request (one indexed query), as snapshots are written
+    by the sync worker
+    """
+
+    def __init__(self) -> None:
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, db: Session, ranking_type: str, season: int = None):
+        if season is None:
+            season = datetime.datetime.now().year
+        if ranking_type not in rankings.RANKING_TYPES:
+            return rankings.get_ranking(db, ranking_type)
+        version = rankings.get_latest_snapshot_version(db, season)
+        if version is None:
+            # No snapshots yet (until the first sync finishes)
+            return jsonable_encoder(rankings.get_ranking(db, ranking_type))
+        key = (ranking_type, season, version)
+        with self.lock:
+            data = self.entries.get(key)
+        if data is None:
+            snapshots = rankings.get_ranking_snapshots(db, version, season)
+            with self.lock:
+                # Older versions are not needed anymore
+                self.entries = {
+                    key: value
+                    for key, value in self.entries.items()
+                    if key[2] == version
+                }
+                for snapshot_type in rankings.RANKING_TYPES:
+                    self.entries[(snapshot_type, season, version)] = snapshots.get(
+                        snapshot_type, []
+                    )
+                data = self.entries[key]
+        return data
+
+
+ranking_cache = RankingCache()
@@ -0,0 +1,62 @@
+from urllib.parse import quote
+
+import httpx
+from sqlalchemy.orm import Session
+
+from ..config import Config
+from ..crud import games
+from .async_http import AsyncClients, send_with_retries
+from .logger import LogManager
+
+log_manager = LogManager()
+logger = log_manager.get_logger()
+
+config = Config()
+
+async_clients = AsyncClients(lambda: httpx.AsyncClient(timeout=config.RAWG_TIMEOUT))
+
+
+def normalize_query(query: str) -> str:
+    """Cache key of a search: lowercase, without repeated spaces"""
+    return " ".join(query.lower().split())
+
+
+class RawgApi:
+    def get_async_client(self) -> httpx.AsyncClient:
+        return async_clients.get()
+
+    async def aclose(self):
+        """Close the async client of the running event loop (if any)"""
+        await async_clients.aclose()
+
+    async def search(self, query: str, db: Session = None):
+        """
+        Get the first RAWG search result for query (None if there is none).
+        Results are cached on the DB (if db is set) by normalized query, and
+        requests are retried with exponential backoff on 429/5xx responses and
+        connection errors
+        """
+        query = normalize_query(query)
+        if db is not None:
+            cached = games.get_rawg_cache(db, query)
+            if cached is not None:
+                return cached.response
+        try:
+            response = await send_with_retries(
+                self.get_async_client(),
+                "GET",
+                config.RAWG_URL + quote(query),
+                config.RAWG_MAX_RETRIES,
+            )
+        except httpx.TransportError as e:
+            logger.error("Error on RAWG request: " + str(e))
+            raise
+        if not response.is_success:
+            raise Exception("Error({}) on RAWG request".format(response.status_code))
+        try:
+            rawg_content = response.json()["results"][0]
+        except Exception:
+            rawg_content = None
+        if db is not None:
+            games.save_rawg_cache(db, query, rawg_content)
+        return rawg_content
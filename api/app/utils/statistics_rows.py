@@ -0,0 +1,80 @@
+import threading
+
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from ..database import models
+from .logger import LogManager
+
+log_manager = LogManager()
+logger = log_manager.get_logger()
+
+# Statistics tables: key column and default values of new rows
+STATISTICS_TABLES = {
+    models.UserStatistics: ("user_id", {"current_ranking_hours": 1000}),
+    models.UserStatisticsHistorical: ("user_id", {"current_ranking_hours": 1000}),
+    models.GameStatistics: ("game_id", {"current_ranking": 1000000}),
+    models.GameStatisticsHistorical: ("game_id", {"current_ranking": 1000000}),
+}
+
+
+class StatisticsRows:
+    """
+    Keys of the existing statistics rows (users and games), loaded with one
+    query per table, so only the missing rows are inserted (INSERT IGNORE).
+    Must be cleared when the statistics tables are emptied
+    """
+
+    def __init__(self) -> None:
+        # model -> set of keys
+        self.known = {}
+        self.lock = threading.Lock()
+
+    def get_known(self, db: Session, model) -> set:
+        with self.lock:
+            known = self.known.get(model)
+        if known is None:
+            key = getattr(model, STATISTICS_TABLES[model][0])
+            known = set(db.execute(select(key)).scalars())
+            with self.lock:
+                known = self.known.setdefault(model, known)
+        return known
+
+    def ensure(self, db: Session, model, keys: list):
+        """Insert the rows of the keys without one on the model table"""
+        key_name, defaults = STATISTICS_TABLES[model]
+        known = self.get_known(db, model)
+        with self.lock:
+            missing = sorted(set(keys) - known)
+        if len(missing) == 0:
+            return
+        try:
+            stmt = (
+                mysql_insert(model)
+                .prefix_with("IGNORE")
+                .values([{key_name: key, **defaults} for key in missing])
+            )
+            db.execute(stmt)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error("Error creating " + model.__tablename__ + ": " + str(e))
+            raise e
+        with self.lock:
+            known.update(missing)
+
+    def ensure_users(self, db: Session, user_ids: list[int]):
+        self.ensure(db, models.UserStatistics, user_ids)
+        self.ensure(db, models.UserStatisticsHistorical, user_ids)
+
+    def ensure_games(self, db: Session, game_ids: list[str]):
+        self.ensure(db, models.GameStatistics, game_ids)
+        self.ensure(db, models.GameStatisticsHistorical, game_ids)
+
+    def clear(self):
+        with self.lock:
+            self.known = {}
+
+
+statistics_rows = StatisticsRows()
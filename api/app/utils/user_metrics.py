@@ -0,0 +1,92 @@
+import datetime
+
+from sqlalchemy.orm import Session
+
+from ..crud import time_entries
+from .achievements import AchievementMetric
+
+# A day is played with at least one session of 10 minutes
+PLAYED_DAY_MIN_SESSION = 600
+
+
+class UserMetrics:
+    """
+    Season statistics of a user, aggregated in one pass over their time
+    entries (sorted by start)
+    """
+
+    def __init__(self, season: int) -> None:
+        self.season = season
+        self.played_time = 0
+        # game_id -> seconds
+        self.games_played_time = {}
+        # day -> seconds
+        self.days_played_time = {}
+        self.played_days = set()
+        # Finished time entries, by start
+        self.sessions = []
+        # hour -> first start of a time entry on that hour
+        self.first_start_by_hour = {}
+        self.new_year_session = None
+
+    def add(self, entry):
+        new_year = datetime.date(self.season, 1, 1)
+        if self.new_year_session is None and (
+            entry.start.date() == new_year
+            or (entry.end is not None and entry.end.date() == new_year)
+        ):
+            self.new_year_session = entry
+        if entry.start.year != self.season:
+            return
+        self.first_start_by_hour.setdefault(entry.start.hour, entry.start)
+        if entry.duration is None:
+            return
+        day = entry.start.date()
+        self.played_time += entry.duration
+        self.games_played_time[entry.project_clockify_id] = (
+            self.games_played_time.get(entry.project_clockify_id, 0) + entry.duration
+        )
+        self.sessions.append(entry)
+        if entry.duration > 0:
+            self.days_played_time[day] = (
+                self.days_played_time.get(day, 0) + entry.duration
+            )
+        if entry.duration >= PLAYED_DAY_MIN_SESSION:
+            self.played_days.add(day)
+
+    def get_played_days(self, start_date: datetime.date = None) -> list:
+        """Sorted played days (from start_date)"""
+        return sorted(
+            day for day in self.played_days if start_date is None or day >= start_date
+        )
+
+    def get_games_played_time(self) -> list:
+        return list(self.games_played_time.items())
+
+    def get_achievement_metrics(self) -> dict:
+        """Values of the achievement metrics computed from the time entries"""
+        played_days = self.get_played_days()
+        return {
+            AchievementMetric.PLAYED_TIME: self.played_time,
+            AchievementMetric.PLAYED_DAYS: (len(played_days), played_days),
+            AchievementMetric.GAME_PLAYED_TIME: self.get_games_played_time(),
+            AchievementMetric.DAY_PLAYED_TIME: sorted(self.days_played_time.items()),
+            AchievementMetric.MIN_SESSION: self.sessions,
+            AchievementMetric.MAX_SESSION: self.sessions,
+            AchievementMetric.SESSION_START_HOUR: self.first_start_by_hour,
+            AchievementMetric.NEW_YEAR_SESSION: self.new_year_session,
+        }
+
+
+def get_users_metrics(
+    db: Session, user_ids: list[int], season: int
+) -> dict[int, UserMetrics]:
+    """Aggregate the season statistics of the users with a single query"""
+    metrics = {user_id: UserMetrics(season) for user_id in user_ids}
+    for entry in time_entries.get_users_season_entries(db, user_ids, season):
+        metrics[entry.user_id].add(entry)
+    return metrics
+
+
+def get_user_metrics(db: Session, user_id: int, season: int) -> UserMetrics:
+    return get_users_metrics(db, [user_id], season)[user_id]
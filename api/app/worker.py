@@ -0,0 +1,94 @@
+import asyncio
+
+from .config import Config
+from .crud import games, request_sync
+from .database import models
+from .database.database import SessionLocal, engine
+from .database.migrations import upgrade_schema
+from .utils import actions as actions
+from .utils import my_utils as utils
+from .utils.logger import LogManager
+
+log_manager = LogManager()
+logger = log_manager.get_logger()
+
+config = Config()
+
+
+async def run_next_sync() -> bool:
+    """Run the next pending sync job. Returns False if the queue is empty"""
+    db = SessionLocal()
+    try:
+        job = request_sync.claim_next_sync(db)
+        if job is None:
+            return False
+        logger.info("Running sync job " + str(job.id) + ": " + str(job.params))
+        try:
+            await actions.sync_data(db, **job.params)
+        except Exception as e:
+            logger.error("Error on sync job " + str(job.id) + ": " + str(e))
+            db.rollback()
+            request_sync.finish_sync(db, job, error=str(e))
+            return True
+        request_sync.finish_sync(db, job)
+        return True
+    finally:
+        db.close()
+
+
+async def run_next_enrichment() -> bool:
+    """
+    Add the RAWG/HLTB info of the next game added from Clockify. Returns
+    False if there is none pending
+    """
+    db = SessionLocal()
+    try:
+        enrichment = games.claim_next_enrichment(db)
+        if enrichment is None:
+            return False
+        game = games.get_game_by_id(db, enrichment.game_id)
+        if game is None:
+            logger.error("Game " + str(enrichment.game_id) + " to enrich not found")
+            games.finish_enrichment(db, enrichment, error="Game not found", retry=False)
+            return True
+        logger.info("Getting info of game " + str(game.name))
+        try:
+            game_info = await utils.get_new_game_info(
+                {"id": game.id, "name": game.name}, db, raise_errors=True
+            )
+            games.enrich_game(db, game.id, game_info)
+        except Exception as e:
+            logger.error(
+                "Error getting info of game " + str(game.name) + ": " + str(e)
+            )
+            db.rollback()
+            games.finish_enrichment(db, enrichment, error=str(e))
+            return True
+        games.finish_enrichment(db, enrichment)
+        return True
+    finally:
+        db.close()
+
+
+async def main():
+    db = SessionLocal()
+    try:
+        request_sync.requeue_running_syncs(db)
+    finally:
+        db.close()
+    logger.info("Sync worker started")
+    while True:
+        try:
+            # Syncs go first, games info is added when there are none
+            has_jobs = await run_next_sync() or await run_next_enrichment()
+        except Exception as e:
+            logger.error("Error on sync worker: " + str(e))
+            has_jobs = False
+        if not has_jobs:
+            await asyncio.sleep(config.SYNC_WORKER_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    models.Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    asyncio.run(main())
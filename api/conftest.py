@@ -0,0 +1,39 @@
+import os
+
+# Config is read from the environment when there is no .env
+TEST_ENV = {
+    "API_LOG_LEVEL": "INFO",
+    "TELEGRAM_GROUP_ID": "0",
+    "ADMIN_USERS": "[]",
+    "DEFAULT_ADMIN_PASS": "test",
+    "TELEGRAM_TOKEN": "test",
+    "TELEGRAM_ADMIN_CHAT_ID": "0",
+    "MARIADB_HOST": "localhost",
+    "MARIADB_DATABASE": "test",
+    "MARIADB_USER": "test",
+    "MARIADB_PASSWORD": "test",
+    "CLOCKIFY_BASEURL": "https://api.clockify.me/api/v1",
+    "CLOCKIFY_WORKSPACE": "test",
+    "CLOCKIFY_ADMIN_API_KEY": "test",
+    "RAWG_URL": "https://api.rawg.io/api/games?search=",
+    "INITIAL_DATE": "2024-01-01",
+    "INVITATION_KEY": "test",
+    "API_KEY": "test",
+    "SECRET_KEY": "test",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "CORS_ORIGINS": "[]",
+    "SMTP_HOST": "localhost",
+    "SMTP_PORT": "25",
+    "SMTP_EMAIL": "test@test.com",
+    "SMTP_USER": "test",
+    "SMTP_PASS": "test",
+    "SENTRY_URL_API": "",
+    "ENVIRONMENT": "test",
+    "OPENAI_API_KEY": "test",
+    "OPENAI_MODEL": "test",
+    "SYNC_DAYS": "7",
+    "CLOCKIFY_SIGNATURES": '["test-signature"]',
+}
+
+for key, value in TEST_ENV.items():
+    os.environ.setdefault(key, value)
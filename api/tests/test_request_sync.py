@@ -0,0 +1,111 @@
+import json
+from unittest import mock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.crud import request_sync
+from app.routers import webhooks_template
+
+ENTRY = {
+    "id": "65a1b2c3d4e5f6a7b8c9d0e1",
+    "projectId": "65a1b2c3d4e5f6a7b8c9d0e2",
+    "user": {"id": "65a1b2c3d4e5f6a7b8c9d0e3"},
+    "timeInterval": {
+        "start": "2024-03-01T18:00:00Z",
+        "end": "2024-03-01T19:00:00Z",
+        "duration": "PT1H",
+    },
+}
+OTHER_ENTRY = dict(ENTRY, id="65a1b2c3d4e5f6a7b8c9d0e4")
+
+
+def test_merge_sync_entries_removes_deleted():
+    """An entry created and then deleted while the job is pending is dropped"""
+    merged = request_sync.merge_sync_entries([ENTRY], [], [], [ENTRY["id"]])
+    assert merged == {"entries": [], "deleted": [ENTRY["id"]]}
+
+
+def test_merge_sync_entries_keeps_last_version():
+    updated = dict(ENTRY, description="updated")
+    merged = request_sync.merge_sync_entries(
+        [ENTRY, OTHER_ENTRY], [], [updated], []
+    )
+    assert merged == {"entries": [updated, OTHER_ENTRY], "deleted": []}
+
+
+def test_merge_sync_entries_keeps_deleted_ids_once():
+    merged = request_sync.merge_sync_entries(
+        [], [ENTRY["id"]], [OTHER_ENTRY], [ENTRY["id"]]
+    )
+    assert merged == {"entries": [OTHER_ENTRY], "deleted": [ENTRY["id"]]}
+
+
+@pytest.fixture
+def db():
+    return mock.MagicMock()
+
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(webhooks_template.router)
+    app.dependency_overrides[webhooks_template.get_db] = lambda: db
+    return TestClient(app, raise_server_exceptions=False)
+
+
+@pytest.fixture
+def crud():
+    """The DB functions used by the webhook, with a known user"""
+    with mock.patch.object(
+        request_sync, "register_webhook_event", return_value=True
+    ) as register, mock.patch.object(
+        request_sync, "enqueue_sync", return_value=mock.Mock(id=1)
+    ) as enqueue, mock.patch.object(
+        webhooks_template.users, "get_user_by_clockify_id"
+    ), mock.patch.object(
+        webhooks_template.time_entries, "write_clockify_entries"
+    ) as write, mock.patch.object(
+        webhooks_template.time_entries, "delete_time_entry"
+    ) as delete:
+        yield mock.Mock(register=register, enqueue=enqueue, write=write, delete=delete)
+
+
+def send_event(client: TestClient, event: str, entry: dict):
+    return client.post(
+        "/webhooks/sync-data",
+        content=json.dumps(entry),
+        headers={
+            "clockify-webhook-event-type": event,
+            "clockify-signature": "test-signature",
+        },
+    )
+
+
+def test_webhook_drops_duplicated_events(client, db, crud):
+    crud.register.return_value = False
+    response = send_event(client, "NEW_TIME_ENTRY", ENTRY)
+    assert response.status_code == 202
+    assert response.json() == {"message": "Duplicated event"}
+    crud.write.assert_not_called()
+    crud.enqueue.assert_not_called()
+    db.rollback.assert_called_once()
+
+
+def test_webhook_queues_deleted_entries(client, crud):
+    response = send_event(client, "TIME_ENTRY_DELETED", ENTRY)
+    assert response.status_code == 202
+    crud.delete.assert_called_once_with(mock.ANY, ENTRY["id"])
+    params = crud.enqueue.call_args.args[1]
+    assert params["entries"] == []
+    assert params["deleted"] == [ENTRY["id"]]
+
+
+def test_webhook_does_not_save_failed_events(client, crud):
+    """The event is saved with its change, so a failed one can be retried"""
+    crud.write.side_effect = Exception("DB error")
+    response = send_event(client, "NEW_TIME_ENTRY", ENTRY)
+    assert response.status_code == 500
+    assert crud.register.call_args.kwargs == {"commit": False}
+    crud.enqueue.assert_not_called()